@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, shutil, subprocess, sys, tempfile
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script checks that the delta report of mergegb.py lists every species and gene that extractgb.py selects from a merged batch. A small gb file and a batch of new and updated records, including features matched to a key only through their product, are merged with mergegb.py and extracted with extractgb.py through the merged index; the exit status is 1 if any extracted species and gene from the batch is missing from the report.')
+parser.add_argument("-k", "--keep", help="keep the working directory with the test files", action='store_true')
+parser.add_argument("-p", "--python", metavar='STR', help="python interpreter for the scripts [this interpreter]", type=str, default=sys.executable)
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+parser.add_argument("-w", "--workdir", metavar='STR', help="working directory for test files [temporary directory]", type=str)
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set variables
+# ============================================================
+
+bench_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
+bin_dir = os.path.join(os.path.dirname(bench_dir), 'bin')
+key_dict = {'COX1': ['COX1', 'cytochrome c oxidase subunit I'], 'CYTB': ['CYTB', 'cytochrome b']}
+gb_records = [('XT000001.1', 'Xenopus tropicalis', [('COX1', 'cytochrome c oxidase subunit I')]),
+              ('LA000002.1', 'Litoria aurea', [('CYTB', 'cytochrome b')])]
+batch_records = [('AB000010.1', 'Litoria aurea', [('ND1X', 'cytochrome c oxidase subunit I')]),
+                 ('XT000001.2', 'Xenopus tropicalis', [('COX1', 'cytochrome c oxidase subunit I')]),
+                 ('HA000011.1', 'Hyla arborea', [(None, 'cytochrome b')])]
+missing_list = []
+
+
+# Function to write records with one CDS per gene and product pair
+# ============================================================
+
+def writerecords(file_name, records):
+    out_gb = open(file_name, 'w')
+    for record_id, species, features in records:
+        length = 300 * len(features) + 60
+        out_gb.write('LOCUS       '+record_id.split('.')[0].ljust(16)+' '+str(length).rjust(11)+' bp    DNA     linear   VRT 01-JAN-2017\n'
+                     +'DEFINITION  '+species+' test record.\n'
+                     +'ACCESSION   '+record_id.split('.')[0]+'\n'
+                     +'VERSION     '+record_id+'\n'
+                     +'KEYWORDS    .\n'
+                     +'SOURCE      '+species+'\n'
+                     +'  ORGANISM  '+species+'\n'
+                     +'            Eukaryota; Amphibia.\n'
+                     +'FEATURES             Location/Qualifiers\n'
+                     +'     source          1..'+str(length)+'\n'
+                     +'                     /organism="'+species+'"\n')
+        for number, (gene, product) in enumerate(features):
+            out_gb.write('     CDS             '+str(300 * number + 31)+'..'+str(300 * number + 330)+'\n')
+            if gene:
+                out_gb.write('                     /gene="'+gene+'"\n')
+            out_gb.write('                     /product="'+product+'"\n')
+        seq = 'acgt' * (length // 4) + 'acgt'[:length % 4]
+        out_gb.write('ORIGIN\n')
+        for i in range(0, length, 60):
+            out_gb.write(str(i + 1).rjust(9)+' '+' '.join([seq[j:j + 10] for j in range(i, min(i + 60, length), 10)])+'\n')
+        out_gb.write('//\n')
+    out_gb.close()
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Merge the batch and extract through the merged index, removing the test files even if a command fails
+# ============================================================
+
+workdir = args.workdir or tempfile.mkdtemp(prefix='checkmerge.')
+try:
+    if not os.path.isdir(os.path.join(workdir, 'keys')):
+        os.makedirs(os.path.join(workdir, 'keys'))
+    for gene_name in key_dict:
+        out_key = open(os.path.join(workdir, 'keys', gene_name+'.key'), 'w')
+        out_key.write('GB_name\n'+'\n'.join(key_dict[gene_name])+'\n')
+        out_key.close()
+    writerecords(os.path.join(workdir, 'test.gb'), gb_records)
+    writerecords(os.path.join(workdir, 'batch.gb'), batch_records)
+    script = lambda name: [args.python, os.path.join(bin_dir, name)]
+    subprocess.check_call(script('indexgb.py')+['-o', 'test.gb.idx', 'test.gb'], cwd=workdir)
+    subprocess.check_call(script('mergegb.py')+['-s', '-k', 'keys', '-r', 'test.gb.delta', 'test.gb', 'batch.gb'], cwd=workdir)
+    subprocess.check_call(script('extractgb.py')+['-s', '-i', 'test.gb.idx', '-l', 'test.log', '-t', 'test.table', '-o', 'test', 'keys', 'test.gb'], cwd=workdir)
+    delta_set = set([tuple(line.split('\t')[0:2]) for line in open(os.path.join(workdir, 'test.gb.delta'), 'r')])
+    batch_set = set([x[0] for x in batch_records])
+    for line in open(os.path.join(workdir, 'test.table'), 'r'):
+        line = line.split('\t')
+        if line[1] in batch_set and (line[0], line[2]) not in delta_set:
+            missing_list.append(line[0]+' '+line[2]+' ('+line[1]+')')
+finally:
+    if args.keep:
+        sys.stderr.write('Test files kept in '+workdir+'\n')
+    elif not args.workdir:
+        shutil.rmtree(workdir)
+
+
+# Report species and genes extracted from the batch but missing from the delta report
+# ============================================================
+
+if missing_list:
+    error('extracted from the batch but missing from the delta report: '+', '.join(missing_list), 1)
+sys.stdout.write('Delta report lists all '+str(len(delta_set))+' species and genes changed by the batch.\n')
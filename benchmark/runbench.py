@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, shutil, subprocess, sys, tempfile, time
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script benchmarks the bin scripts on synthetic gb and phylip files of several sizes. Each command is run as a child process and its wall time, records per second and peak resident memory are reported and compared against stored baselines; the exit status is 1 if any timing or memory use exceeds its baseline by more than the tolerance.')
+parser.add_argument("-b", "--baselines", metavar='STR', help="baseline file [baselines.tsv next to this script]", type=str)
+parser.add_argument("-k", "--keep", help="keep the working directory with the synthetic files", action='store_true')
+parser.add_argument("-l", "--large", metavar='INT', help="multi-megabase records added to each synthetic gb file [0]", type=int, default=0)
+parser.add_argument("-m", "--min-seconds", metavar='FLOAT', help="wall times below this are too noisy to compare [0.2]", type=float, default=0.2)
+parser.add_argument("-n", "--repeat", metavar='INT', help="runs per command, keeping the fastest [3]", type=int, default=3)
+parser.add_argument("-o", "--only", metavar='STR', help="comma-separated benchmark names to run [all]", type=str)
+parser.add_argument("-p", "--python", metavar='STR', help="python interpreter for the scripts [this interpreter]", type=str, default=sys.executable)
+parser.add_argument("-s", "--sizes", metavar='STR', help="comma-separated numbers of gb records; phylip files get one taxon per 10 records [1000,10000]", type=str, default='1000,10000')
+parser.add_argument("-t", "--tolerance", metavar='FLOAT', help="allowed ratio over the baseline before reporting a regression [1.5]", type=float, default=1.5)
+parser.add_argument("-u", "--update", help="write the measured values as the new baselines", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+parser.add_argument("-w", "--workdir", metavar='STR', help="working directory for synthetic files [temporary directory]", type=str)
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set variables
+# ============================================================
+
+bench_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
+bin_dir = os.path.join(os.path.dirname(bench_dir), 'bin')
+baseline_file = args.baselines or os.path.join(bench_dir, 'baselines.tsv')
+only_set = set(args.only.split(',')) if args.only else None
+baseline_dict = {}
+result_list = []
+regression = False
+try:
+    size_list = [int(x) for x in args.sizes.split(',')]
+except ValueError:
+    error('sizes must be comma-separated integers: '+args.sizes, 1)
+
+
+# Function to run a command and return wall seconds and peak rss in KB
+# ============================================================
+
+def measure(command, workdir):
+    devnull = open(os.devnull, 'w')
+    start = time.time()
+    process = subprocess.Popen(command, cwd=workdir, stdout=devnull, stderr=devnull)
+    status, rusage = os.wait4(process.pid, 0)[1:]
+    seconds = time.time() - start
+    devnull.close()
+    if status != 0:
+        error('command failed with status '+str(status)+': '+' '.join(command), 1)
+    return seconds, rusage.ru_maxrss
+
+
+# Function to return the benchmark commands for one size
+# ============================================================
+
+def benchmarks(size, workdir):
+    script = lambda name: [args.python, os.path.join(bin_dir, name)]
+    return [('indexgb', size, script('indexgb.py')+['-o', 'syn.gb.idx', 'syn.gb']),
+            ('extractgb', size, script('extractgb.py')+['-s', '-o', 'plain', 'keys', 'syn.gb']),
+            ('extractgb_index', size, script('extractgb.py')+['-s', '-i', 'syn.gb.idx', '-o', 'indexed', 'keys', 'syn.gb']),
+            ('allgenesingb_fast', size, script('allgenesingb.py')+['-f', '-o', 'fast', 'syn.gb']),
+            ('allgenesingb_index', size, script('allgenesingb.py')+['-f', '-i', 'syn.gb.idx', '-o', 'indexed', 'syn.gb']),
+            ('genenamesfromgb_fast', size, script('genenamesfromgb.py')+['-f', '-c', 'fresh.names_cache', '-o', 'names', os.path.join('keys', 'GENE000.key'), 'syn.gb']),
+            ('phyfilter', size // 10, script('phyfilter.py')+['-s', '-o', 'filtered.phy', 'syn.phy'])]
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Read baselines
+# ============================================================
+
+if os.path.exists(baseline_file):
+    for line in open(baseline_file, 'r'):
+        if line.startswith('#') or not line.strip():
+            continue
+        line = line.rstrip('\n').split('\t')
+        baseline_dict[(line[0], int(line[1]))] = (float(line[2]), int(line[4]))
+
+
+# Run benchmarks for each size, removing the synthetic files even if a command fails
+# ============================================================
+
+workroot = args.workdir or tempfile.mkdtemp(prefix='runbench.')
+try:
+    for size in size_list:
+        workdir = os.path.join(workroot, str(size))
+        if not os.path.isdir(workdir):
+            os.makedirs(workdir)
+        subprocess.check_call([args.python, os.path.join(bench_dir, 'synthgb.py'), '-r', str(size), '-s', str(max(size // 5, 1)), '-m', str(args.large), '-k', 'keys', 'syn.gb'], cwd=workdir)
+        subprocess.check_call([args.python, os.path.join(bench_dir, 'synthphy.py'), '-t', str(max(size // 10, 2)), '-n', '10000', 'syn.phy'], cwd=workdir)
+        subprocess.check_call([args.python, os.path.join(bin_dir, 'indexgb.py'), '-o', 'syn.gb.idx', 'syn.gb'], cwd=workdir)
+        for name, records, command in benchmarks(size, workdir):
+            if only_set and name not in only_set:
+                continue
+            runs = []
+            for repeat in range(max(args.repeat, 1)):
+                if name.startswith('genenamesfromgb') and os.path.exists(os.path.join(workdir, 'fresh.names_cache')):
+                    os.remove(os.path.join(workdir, 'fresh.names_cache'))
+                runs.append(measure(command, workdir))
+            seconds = min([x[0] for x in runs])
+            maxrss = max([x[1] for x in runs])
+            status = 'new'
+            if (name, size) in baseline_dict:
+                base_seconds, base_maxrss = baseline_dict[(name, size)]
+                status = 'ok'
+                if max(seconds, base_seconds) >= args.min_seconds and seconds > base_seconds * args.tolerance:
+                    status = 'slower'
+                if maxrss > base_maxrss * args.tolerance:
+                    status = 'larger' if status == 'ok' else status+',larger'
+                if status != 'ok':
+                    regression = True
+            result_list.append((name, size, seconds, records / seconds if seconds else 0.0, maxrss, status))
+            sys.stdout.write(name.ljust(22)+str(size).rjust(8)+('%.3f s' % seconds).rjust(12)+('%.0f rec/s' % result_list[-1][3]).rjust(16)+('%d KB' % maxrss).rjust(12)+'  '+status+'\n')
+            sys.stdout.flush()
+finally:
+    if not args.keep and not args.workdir:
+        shutil.rmtree(workroot)
+    elif args.keep:
+        sys.stderr.write('Synthetic files kept in '+workroot+'\n')
+
+
+# Write out baselines
+# ============================================================
+
+if args.update:
+    for name, size, seconds, rate, maxrss, status in result_list:
+        baseline_dict[(name, size)] = (seconds, maxrss, rate)
+    out_base = open(baseline_file+'.tmp', 'w')
+    out_base.write('#name\tsize\tseconds\trecords_per_second\tmaxrss_kb\n')
+    for name, size in sorted(baseline_dict):
+        values = baseline_dict[(name, size)]
+        rate = values[2] if len(values) > 2 else 0.0
+        out_base.write(name+'\t'+str(size)+'\t'+('%.3f' % values[0])+'\t'+('%.1f' % rate)+'\t'+str(values[1])+'\n')
+    out_base.close()
+    os.rename(baseline_file+'.tmp', baseline_file)
+elif regression:
+    sys.exit(1)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, random, string, sys
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script writes a synthetic gb file for benchmarking. Each record belongs to a random species and annotates a random set of genes with a gene and a CDS feature at identical coordinates; gene qualifiers use a random synonym of the gene name. One key file per gene (GENE###.key) with all of its synonyms is written if requested.')
+parser.add_argument("-a", "--ambiguous", metavar='FLOAT', help="share of records whose sequence only contains N's [0.01]", type=float, default=0.01)
+parser.add_argument("-f", "--features", metavar='INT', help="maximum number of genes annotated per record [4]", type=int, default=4)
+parser.add_argument("-g", "--genes", metavar='INT', help="number of distinct genes [20]", type=int, default=20)
+parser.add_argument("-k", "--keys", metavar='STR', help="directory for gene key files [none]", type=str)
+parser.add_argument("-l", "--min-length", metavar='INT', help="minimum record length [500]", type=int, default=500)
+parser.add_argument("-L", "--max-length", metavar='INT', help="maximum record length [20000]", type=int, default=20000)
+parser.add_argument("-m", "--large", metavar='INT', help="number of additional multi-megabase records [0]", type=int, default=0)
+parser.add_argument("-M", "--large-length", metavar='INT', help="length of multi-megabase records [5000000]", type=int, default=5000000)
+parser.add_argument("-r", "--records", metavar='INT', help="number of records [1000]", type=int, default=1000)
+parser.add_argument("-s", "--species", metavar='INT', help="number of species [200]", type=int, default=200)
+parser.add_argument("-S", "--seed", metavar='INT', help="random seed [1]", type=int, default=1)
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+parser.add_argument("-y", "--synonyms", metavar='INT', help="synonyms per gene name [3]", type=int, default=3)
+required = parser.add_argument_group('required arguments')
+required.add_argument("output", help="output gb file (- for stdout)", type=str)
+args = parser.parse_args()
+
+
+# Set input and output files
+# ============================================================
+
+out_gb = sys.stdout
+if args.output != '-':
+    out_gb = open(args.output, 'w', 1048576)
+
+
+# Set variables
+# ============================================================
+
+rng = random.Random(args.seed)
+base_table = string.maketrans(''.join(chr(x) for x in range(256)), 'acgt' * 64)
+species_list = ['Genus%03d species%05d' % (x // 5, x) for x in range(args.species)]
+gene_list = [['GENE%03d' % x] + ['GENE%03dS%d' % (x, y) for y in range(1, args.synonyms + 1)] for x in range(args.genes)]
+
+
+# Function to return a random sequence of a length
+# ============================================================
+
+def randomseq(length):
+    if not length:
+        return ''
+    return ('%0*x' % (2 * length, rng.getrandbits(8 * length))).decode('hex').translate(base_table)
+
+
+# Function to write one record
+# ============================================================
+
+def writerecord(number, length):
+    name = 'SYN%08d' % number
+    species = rng.choice(species_list)
+    out_gb.write('LOCUS       '+name.ljust(16)+' '+str(length).rjust(11)+' bp    DNA     linear   SYN 01-JAN-2017\n'
+                 +'DEFINITION  synthetic record '+str(number)+'.\n'
+                 +'ACCESSION   '+name+'\n'
+                 +'VERSION     '+name+'.1\n'
+                 +'KEYWORDS    .\n'
+                 +'SOURCE      '+species+'\n'
+                 +'  ORGANISM  '+species+'\n'
+                 +'            Eukaryota; Synthetica.\n'
+                 +'FEATURES             Location/Qualifiers\n'
+                 +'     source          1..'+str(length)+'\n'
+                 +'                     /organism="'+species+'"\n')
+    position = 0
+    for gene_names in rng.sample(gene_list, min(len(gene_list), rng.randint(1, args.features))):
+        start = rng.randint(position + 1, position + 100)
+        end = rng.randint(start + 100, start + 1500)
+        if end > length:
+            break
+        location = str(start)+'..'+str(end)
+        if rng.random() < 0.5:
+            location = 'complement('+location+')'
+        out_gb.write('     gene            '+location+'\n'
+                     +'                     /gene="'+rng.choice(gene_names)+'"\n'
+                     +'     CDS             '+location+'\n'
+                     +'                     /gene="'+gene_names[0]+'"\n'
+                     +'                     /product="synthetic protein '+gene_names[0][4:]+'"\n')
+        position = end
+    seq = 'n' * length if rng.random() < args.ambiguous else randomseq(length)
+    out_gb.write('ORIGIN\n')
+    for i in range(0, length, 60):
+        out_gb.write(str(i + 1).rjust(9)+' '+' '.join([seq[j:j + 10] for j in range(i, min(i + 60, length), 10)])+'\n')
+    out_gb.write('//\n')
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Write out records, with multi-megabase records spread through the file
+# ============================================================
+
+large_set = set(rng.sample(range(args.records + args.large), args.large))
+for number in range(args.records + args.large):
+    if number in large_set:
+        writerecord(number, args.large_length)
+    else:
+        writerecord(number, rng.randint(args.min_length, args.max_length))
+
+
+# Write out key files
+# ============================================================
+
+if args.keys:
+    if not os.path.isdir(args.keys):
+        os.makedirs(args.keys)
+    for gene_names in gene_list:
+        out_key = open(os.path.join(args.keys, gene_names[0]+'.key'), 'w')
+        out_key.write('GB_name\n'+'\n'.join(gene_names)+'\n')
+        out_key.close()
+
+
+# Close output files
+# ============================================================
+
+if args.output != '-':
+    out_gb.close()
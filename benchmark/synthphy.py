@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, random, string, sys
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script writes a synthetic phylip alignment for benchmarking. Each taxon is either a random row, a copy of an earlier row or a row of only -\'s.')
+parser.add_argument("-d", "--duplicates", metavar='FLOAT', help="share of taxa duplicating an earlier taxon [0.05]", type=float, default=0.05)
+parser.add_argument("-g", "--gaps", metavar='FLOAT', help="share of taxa with only -'s [0.05]", type=float, default=0.05)
+parser.add_argument("-i", "--interleaved", metavar='INT', help="write interleaved blocks of this many sites instead of sequential rows [0]", type=int, default=0)
+parser.add_argument("-n", "--sites", metavar='INT', help="number of sites [10000]", type=int, default=10000)
+parser.add_argument("-S", "--seed", metavar='INT', help="random seed [1]", type=int, default=1)
+parser.add_argument("-t", "--taxa", metavar='INT', help="number of taxa [1000]", type=int, default=1000)
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("output", help="output phylip file (- for stdout)", type=str)
+args = parser.parse_args()
+
+
+# Set input and output files
+# ============================================================
+
+out_phy = sys.stdout
+if args.output != '-':
+    out_phy = open(args.output, 'w', 1048576)
+
+
+# Set variables
+# ============================================================
+
+rng = random.Random(args.seed)
+site_table = string.maketrans(''.join(chr(x) for x in range(256)), 'ACGT-' * 51 + 'A')
+rows = []
+
+
+# Function to return a random row of a length
+# ============================================================
+
+def randomrow(length):
+    return ('%0*x' % (2 * length, rng.getrandbits(8 * length))).decode('hex').translate(site_table)
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Build rows
+# ============================================================
+
+for number in range(args.taxa):
+    draw = rng.random()
+    if draw < args.gaps:
+        rows.append('-' * args.sites)
+    elif draw < args.gaps + args.duplicates and rows:
+        rows.append(rng.choice(rows))
+    else:
+        rows.append(randomrow(args.sites))
+
+
+# Write out rows
+# ============================================================
+
+out_phy.write(' '+str(args.taxa)+' '+str(args.sites)+'\n')
+if args.interleaved > 0:
+    for start in range(0, args.sites, args.interleaved):
+        for number in range(args.taxa):
+            name = ('taxon'+str(number + 1)).ljust(13) if not start else ''
+            out_phy.write(name+rows[number][start:start + args.interleaved]+'\n')
+        out_phy.write('\n')
+else:
+    for number in range(args.taxa):
+        out_phy.write(('taxon'+str(number + 1)).ljust(13)+rows[number]+'\n')
+
+
+# Close output files
+# ============================================================
+
+if args.output != '-':
+    out_phy.close()
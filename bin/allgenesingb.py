@@ -29,176 +29,252 @@
 # Import modules
 # ============================================================
 
-import argparse, os, sys
+import argparse, multiprocessing, os, sys
+import gbtools, metrics
 from Bio import SeqIO
-from collections import defaultdict
+from cStringIO import StringIO
+from collections import defaultdict, namedtuple
 
 
 # Parse arguments
 # ============================================================
 
-parser = argparse.ArgumentParser(description='This script finds all synonymous gene names (output.genes_names), counts all of the gene names (output.genes_count), and counts all of the feature types (output.feature_count) in a gb file.')
+parser = argparse.ArgumentParser(description='This script finds clusters of synonymous gene names that annotate identical feature coordinates, with the number of times each pair of names was seen together (output.genes_name), counts all of the gene names (output.genes_count), counts all of the feature types (output.feature_count), and writes the gene names of each species as a species by gene name presence matrix (output.genes_matrix, for genecoverage.py) in a gb file. The same reports can be written for several clades of a shared gb file (e.g. from cladegb.py) in the same pass.')
+parser.add_argument("-a", "--accessions", metavar='STR', help="file of accessions to analyze, one per line; records are fetched through the index [all]", type=str)
+parser.add_argument("-c", "--clade", metavar='STR', help="accession list of a clade from cladegb.py; its reports are written with the list name without its extension as output prefix (CLADE.acc gives CLADE.genes_name, CLADE.genes_count, CLADE.feature_count, and CLADE.genes_matrix); may be given multiple times [none]", type=str, action='append', default=[])
+parser.add_argument("-f", "--fast", help="scan only record headers and features, skipping sequences", action='store_true')
+parser.add_argument("-i", "--index", metavar='STR', help="index of the input gb file from indexgb.py, used with --accessions, or with --fast to read all records from the index instead of the gb file [input file name.idx]", type=str)
 parser.add_argument("-o", "--output", metavar='STR', help="output prefix [input file name]", type=str)
+parser.add_argument("-w", "--workers", metavar='INT', help="worker processes for parsing shards of the gb file [1]", type=int, default=1)
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
 parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
 required = parser.add_argument_group('required arguments')
 required.add_argument("input", help="input gb file", type=str)
 args = parser.parse_args()
 
 
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
 # Set input and output names
 # ============================================================
 
-in_gb = open(args.input, 'r')
+if args.workers < 1:
+    error('workers must be at least 1', 1)
+if args.index and not os.path.exists(args.index):
+    error('index '+args.index+' not found; run indexgb.py first', 1)
+accessions = None
+if args.accessions:
+    accessions = gbtools.read_accessions(args.accessions)
 if not args.output:
     args.output = args.input
-out_gene_name = open(args.output+'.genes_name', 'w')
-out_gene_count = open(args.output+'.genes_count', 'w')
-out_feature_count = open(args.output+'.feature_count', 'w')
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.input))
 
 
 # Set variables
 # ============================================================
 
-list_features = ['gene','CDS','mRNA','rRNA','tRNA']
-seen_gene_name_dictlist = defaultdict(list)
-primary_gene_name_list = []
-alternate_gene_name_list = []
-unable_to_join_list = []
-genes_total_seen_count_dict = {}
-species_seen_list = []
-species_seen_count = 0
-species_genes_seen_dictlist = defaultdict(list)
-record_id_seen_list = []
-feature_count_dict = {}
+list_features = set(['gene','CDS','mRNA','rRNA','tRNA'])
+Tally = namedtuple('Tally', ['synonym_parent_dict', 'synonym_edge_count_dict', 'genes_total_seen_count_dict', 'species_seen_set', 'species_genes_seen_dictset', 'feature_count_dict'])
+record_id_seen_set = set()
+
+
+# Function to start the counts of one report
+# ============================================================
+
+def new_tally():
+    return Tally({}, defaultdict(int), defaultdict(int), set(), defaultdict(set), defaultdict(int))
+
+
+# Function to find the representative name of a synonym cluster (union-find with path halving)
+# ============================================================
+
+def find_name(tally, test_name):
+    synonym_parent_dict = tally.synonym_parent_dict
+    if test_name not in synonym_parent_dict:
+        synonym_parent_dict[test_name] = test_name
+    while synonym_parent_dict[test_name] != test_name:
+        synonym_parent_dict[test_name] = synonym_parent_dict[synonym_parent_dict[test_name]]
+        test_name = synonym_parent_dict[test_name]
+    return test_name
 
 
-# Function to search dictionary for values and export key
+# Function to join the synonym clusters of two names and count the edge between them
 # ============================================================
 
-def search_dict(test_dict, test_value):
-    for key, value in test_dict.iteritems():
-        if test_value in value:
-            return key
+def join_names(tally, first_name, second_name):
+    tally.synonym_edge_count_dict[(first_name, second_name)] += 1
+    first_root = find_name(tally, first_name)
+    second_root = find_name(tally, second_name)
+    if first_root != second_root:
+        tally.synonym_parent_dict[max(first_root, second_root)] = min(first_root, second_root)
 
 
-# Function to check if gene name is in the key file or already seen; if not, then write out id and name
+# Function to add a record to the counts of one report, counting each gene name once per species
 # ============================================================
 
-def writename(test_name, names_seen, count_dict, species, species_dict):
-    if test_name not in names_seen and test_name not in species_dict[species]:
-        if test_name in count_dict:
-            count_dict[test_name] = count_dict[test_name] + 1
-        else:
-            count_dict[test_name] = 1
-        names_seen.append(test_name)
-        species_dict[species].append(test_name)
-    return names_seen, count_dict, species_dict
+def add_record(tally, species_name, features, name_pairs):
+    tally.species_seen_set.add(species_name)
+    for feature_type, name, start, end, strand in features:
+        tally.feature_count_dict[feature_type] += 1
+        if name is not None and name not in tally.species_genes_seen_dictset[species_name]:
+            tally.species_genes_seen_dictset[species_name].add(name)
+            tally.genes_total_seen_count_dict[name] += 1
+    for first_name, second_name in name_pairs:
+        join_names(tally, first_name, second_name)
+
+
+# Function to group the names and edges of one report by synonym cluster
+# ============================================================
+
+def cluster_names(tally):
+    cluster_names_dictlist = defaultdict(list)
+    cluster_edges_dictlist = defaultdict(list)
+    for name in tally.synonym_parent_dict:
+        cluster_names_dictlist[find_name(tally, name)].append(name)
+    for (first_name, second_name), value in tally.synonym_edge_count_dict.iteritems():
+        cluster_edges_dictlist[find_name(tally, first_name)].append((first_name, second_name, value))
+    return cluster_names_dictlist, cluster_edges_dictlist
+
+
+# Function to write out the synonym clusters with the most common name first and their edge counts, the species
+# count, gene names, and percent of species with each gene name, the feature counts, and the presence matrix of
+# one report with the most common gene names first
+# ============================================================
+
+def write_reports(tally, cluster_names_dictlist, cluster_edges_dictlist, output):
+    out_gene_name = open(output+'.genes_name', 'w')
+    out_gene_count = open(output+'.genes_count', 'w')
+    out_feature_count = open(output+'.feature_count', 'w')
+    genes_total_seen_count_dict = tally.genes_total_seen_count_dict
+    gbtools.write_matrix(output+'.genes_matrix', dict((x, tally.species_genes_seen_dictset.get(x, ())) for x in tally.species_seen_set), sorted(genes_total_seen_count_dict, key=lambda x: (-genes_total_seen_count_dict[x], x)))
+    clusters = [sorted(value, key=lambda x: (-genes_total_seen_count_dict[x], x)) for value in cluster_names_dictlist.itervalues()]
+    for names in sorted(clusters):
+        out_gene_name.write('\t'.join(names)+'\n')
+        for first_name, second_name, value in sorted(cluster_edges_dictlist[find_name(tally, names[0])], key=lambda x: (-x[2], x[0], x[1])):
+            out_gene_name.write('\t'+first_name+'\t'+second_name+'\t'+str(value)+'\n')
+    species_seen_count = len(tally.species_seen_set)
+    out_gene_count.write("A total of "+str(species_seen_count)+" species were counted.\n")
+    for key in genes_total_seen_count_dict:
+        genes_total_seen_count_dict[key] = int(genes_total_seen_count_dict[key]*100/species_seen_count)
+    for key, value in sorted(genes_total_seen_count_dict.iteritems(), key=lambda (k,v): (-v,k)):
+        out_gene_count.write(str(value)+'\t'+key+'\n')
+    for key, value in sorted(tally.feature_count_dict.iteritems(), key=lambda (k,v): (-v,k)):
+        out_feature_count.write(key+'\t'+str(value)+'\n')
+    out_gene_name.close()
+    out_gene_count.close()
+    out_feature_count.close()
+
+
+# Function to summarize a record as its id, species, and annotated features
+# ============================================================
+
+def summarize(entry):
+    features = []
+    for feature in entry.features:
+        name = None
+        if feature.type in list_features:
+            if feature.gene is not None:
+                name = feature.gene.upper()
+            elif feature.product is not None:
+                name = feature.product.upper()
+        features.append((feature.type, name, feature.start, feature.end, feature.strand))
+    return entry.id, entry.organism, features
+
+
+# Function to summarize all records in a byte range of the gb file
+# ============================================================
+
+def summarize_shard(shard):
+    if args.fast:
+        return [summarize(entry) for entry in gbtools.scan_records(args.input, shard[0], shard[1])]
+    return [summarize(gbtools.summarize_record(SeqIO.read(StringIO(raw), "gb"), offset, length)) for offset, length, raw in gbtools.raw_records(args.input, shard[0], shard[1])]
+
+
+# Function to iterate over record summaries, parsing shards in a process pool if requested
+# ============================================================
+
+def summaries():
+    if args.workers > 1 and accessions is None and args.index is None:
+        pool = multiprocessing.Pool(args.workers)
+        for shard_summaries in pool.imap(summarize_shard, gbtools.shard_offsets(args.input, args.workers * 4)):
+            for summary in shard_summaries:
+                yield summary
+        pool.close()
+        pool.join()
+    else:
+        for entry in gbtools.parse_entries(args.input, args.index, accessions, args.fast):
+            yield summarize(entry)
 
 
 ###############################################################################
 # Run
 ###############################################################################
 
-# Parse input gb file
+# Read the accession lists of the clades; each clade has its own counts next to the counts of all records
+# ============================================================
+
+report_list = [(args.output, None, new_tally())]
+for clade_file in args.clade:
+    report_list.append((os.path.splitext(clade_file)[0], gbtools.read_accessions(clade_file), new_tally()))
+
+
+# Parse record summaries in input order
 # ============================================================
 
-for record in SeqIO.parse(in_gb, "gb"):
+run_metrics.phase('summarize')
+for record_id, organism, features in summaries():
+    run_metrics.count(1, len(features))
 
     # Skip records already seen, without a species name, or with cf., sp., or aff. in species name
     # ============================================================
 
-    if record.id in record_id_seen_list or 'organism' not in record.annotations or 'cf.' in record.annotations['organism'] or 'sp.' in record.annotations['organism'] or 'aff.' in record.annotations['organism']:
+    if record_id in record_id_seen_set or not organism or 'cf.' in organism or 'sp.' in organism or 'aff.' in organism:
         continue
 
     else:
-        old_start = False
-        old_end = False
-        old_strand = False
-        old_name = False
-        name = False
-        genes_record_seen_list = []
-        record_id_seen_list.append(record.id)
-
-        # Count number of species
-        # ============================================================
+        record_id_seen_set.add(record_id)
+        species_name = '_'.join(organism.split(' ')[0:2])
 
-        species_name = '_'.join(record.annotations['organism'].split(' ')[0:2])
-        if not species_name in species_seen_list:
-            species_seen_count += 1
-            species_seen_list.append(species_name)
+        # Group names by feature coordinates and pair the names annotating identical feature coordinates
+        # ============================================================
 
-        # Parse through annotated features
+        coordinate_names_dictset = defaultdict(set)
+        for feature_type, name, start, end, strand in features:
+            if name is not None:
+                coordinate_names_dictset[(start, end, strand)].add(name)
+        name_pairs = []
+        for names in coordinate_names_dictset.itervalues():
+            names = sorted(names)
+            for i in range(len(names)):
+                for j in range(i + 1, len(names)):
+                    name_pairs.append((names[i], names[j]))
+
+        # Add the record to the counts of all records and of each clade containing it
         # ============================================================
 
-        for feature in record.features:
-            next = False
-            if feature.type in feature_count_dict:
-                feature_count_dict[feature.type] += 1
-            else:
-                feature_count_dict[feature.type] = 1
-            if feature.type in list_features:
-                if 'gene' in feature.qualifiers:
-                    name = feature.qualifiers['gene'][0].upper()
-                    genes_record_seen_list, genes_total_seen_count_dict, species_genes_seen_dictlist = writename(name, genes_record_seen_list, genes_total_seen_count_dict, species_name, species_genes_seen_dictlist)
-                    if name in primary_gene_name_list: # Primary gene name; previously seen
-                        continue
-                    elif name in alternate_gene_name_list: # Alternate gene name; previously seen
-                        name = search_dict(seen_gene_name_dictlist, name)
-                    else: # Not previously seen
-                        if feature.location.start == old_start and feature.location.end == old_end and feature.location.strand == old_strand and name != old_name: # Matches last parsed annotated feature
-                            if old_name not in primary_gene_name_list:
-                                primary_gene_name_list.append(old_name)
-                            if name not in alternate_gene_name_list:
-                                alternate_gene_name_list.append(name)
-                            seen_gene_name_dictlist[old_name].append(name)
-                            name = old_name
-                        else: # Doesn't match last parsed annotated feature
-                            unable_to_join_list.append(name)
-                    old_start = feature.location.start
-                    old_end = feature.location.end
-                    old_strand = feature.location.strand
-                    old_name = name
-                elif 'product' in feature.qualifiers:
-                    name = feature.qualifiers['product'][0].upper()
-                    genes_record_seen_list, genes_total_seen_count_dict, species_genes_seen_dictlist = writename(name, genes_record_seen_list, genes_total_seen_count_dict, species_name, species_genes_seen_dictlist)
-                    if name in primary_gene_name_list: # Primary gene name; previously seen
-                        continue
-                    elif name in alternate_gene_name_list: # Alternate gene name; previously seen
-                        name = search_dict(seen_gene_name_dictlist, name)
-                    else: # Not previously seen
-                        if feature.location.start == old_start and feature.location.end == old_end and feature.location.strand == old_strand and name != old_name: # Matches last parsed annotated feature
-                            if old_name not in primary_gene_name_list:
-                                primary_gene_name_list.append(old_name)
-                            if name not in alternate_gene_name_list:
-                                alternate_gene_name_list.append(name)
-                            seen_gene_name_dictlist[old_name].append(name)
-                            name = old_name
-                        else: # Doesn't match last parsed annotated feature
-                            unable_to_join_list.append(name)
-                    old_start = feature.location.start
-                    old_end = feature.location.end
-                    old_strand = feature.location.strand
-                    old_name = name
-
-
-# Write out seen_gene_name_dictlist, species count, gene names, and percent of species with each gene name
-# ============================================================
-
-for key, value in sorted(seen_gene_name_dictlist.iteritems(), key=lambda (k,v): (k,v)):
-    out_gene_name.write(key+'\t'+'\t'.join(value)+'\n')
-out_gene_count.write("A total of "+str(species_seen_count)+" species were counted.\n")
-for key in genes_total_seen_count_dict:
-    genes_total_seen_count_dict[key] = int(genes_total_seen_count_dict[key]*100/species_seen_count)
-for key, value in sorted(genes_total_seen_count_dict.iteritems(), key=lambda (k,v): (-v,k)):
-    out_gene_count.write(str(value)+'\t'+key+'\n')
-for key, value in sorted(feature_count_dict.iteritems(), key=lambda (k,v): (-v,k)):
-    out_feature_count.write(key+'\t'+str(value)+'\n')
-
-
-# Close input and output files
-# ============================================================
-
-in_gb.close()
-out_gene_name.close()
-out_gene_count.close()
-out_feature_count.close()
+        for output, clade_ids, tally in report_list:
+            if clade_ids is None or record_id in clade_ids:
+                add_record(tally, species_name, features, name_pairs)
+
+
+# Group names and edges by synonym cluster
+# ============================================================
+
+run_metrics.phase('cluster')
+cluster_list = [cluster_names(tally) for output, clade_ids, tally in report_list]
+
+
+# Write out the reports of all records and of each clade
+# ============================================================
+
+run_metrics.phase('write')
+for (output, clade_ids, tally), (cluster_names_dictlist, cluster_edges_dictlist) in zip(report_list, cluster_list):
+    write_reports(tally, cluster_names_dictlist, cluster_edges_dictlist, output)
+run_metrics.close()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, sys
+import metrics
+from collections import defaultdict
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script reads tblastx output (-outfmt 6) once and flags query sequences without a hit to any sequence other than themselves. Flagged sequences are written in the extractgb.py log format (count, species, and accession), and a summary of the hits of each query (species, accession, gene, hits to other sequences, best hit, percent identity, e-value, bit score, and status) is written if requested.')
+parser.add_argument("-o", "--output", metavar='STR', help="output file name for flagged sequences [stdout]", type=str, default='stdout')
+parser.add_argument("-q", "--query", metavar='STR', help="fasta file of the sequences searched with tblastx [all sequences in the table]", type=str)
+parser.add_argument("-s", "--summary", metavar='STR', help="output file name for the hit summary of each query [none]", type=str)
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("table", help="provenance table of one gene from extractgb.py --table", type=str)
+required.add_argument("blast", help="tblastx output in -outfmt 6", type=str)
+args = parser.parse_args()
+
+
+# Set input and output files
+# ============================================================
+
+out_incorrect = sys.stdout
+if args.output != 'stdout':
+    out_incorrect = open(args.output, 'w')
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.table) + os.path.getsize(args.blast))
+
+
+# Set variables
+# ============================================================
+
+table_dict = {}
+table_order = []
+hit_count_dict = defaultdict(int)
+best_hit_dict = {}
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Read provenance table, numbering species as in the extractgb.py log
+# ============================================================
+
+run_metrics.phase('table')
+for line in open(args.table, 'r'):
+    line = line.rstrip('\n').split('\t')
+    table_order.append(line[0])
+    table_dict[line[0]] = (len(table_order), line[1], line[2])
+
+
+# Set query sequences
+# ============================================================
+
+query_set = set(table_order)
+if args.query:
+    query_set = set()
+    for line in open(args.query, 'r'):
+        if line.startswith('>'):
+            query_set.add((line[1:].split() or [''])[0])
+
+
+# Count hits of each query to other sequences and keep the hit with the highest bit score
+# ============================================================
+
+run_metrics.phase('blast')
+for line in open(args.blast, 'r'):
+    run_metrics.count(1)
+    line = line.rstrip('\n').split('\t')
+    if len(line) < 12 or line[0] == line[1]:
+        continue
+    hit_count_dict[line[0]] += 1
+    if line[0] not in best_hit_dict or float(line[11]) > float(best_hit_dict[line[0]][3]):
+        best_hit_dict[line[0]] = (line[1], line[2], line[10], line[11])
+
+
+# Write out flagged sequences and the hit summary in table order
+# ============================================================
+
+run_metrics.phase('write')
+if args.summary:
+    out_summary = open(args.summary, 'w')
+for species in table_order:
+    if species not in query_set:
+        continue
+    count, accession, gene = table_dict[species]
+    if species not in best_hit_dict:
+        out_incorrect.write(str(count)+'\t'+species+'\t'+accession+'\n')
+    if args.summary:
+        best_hit = best_hit_dict.get(species, ('-', '-', '-', '-'))
+        out_summary.write('\t'.join([species, accession, gene, str(hit_count_dict.get(species, 0))] + list(best_hit)
+                                    + ['ok' if species in best_hit_dict else 'incorrect'])+'\n')
+
+
+# Close output files
+# ============================================================
+
+if args.summary:
+    out_summary.close()
+if args.output != 'stdout':
+    out_incorrect.close()
+run_metrics.close()
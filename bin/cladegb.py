@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, sys
+import gbtools, metrics
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script maps the accession lists of several clades (e.g. from efetch -format acc for each taxonomy ID) onto one shared gb file and its index from indexgb.py, so that overlapping clades share a single copy of each record. Accessions that are not in the gb file, or are newer versions of an indexed record, are written to a download list (output.missing); the indexed ids of the records of each clade are written to an accession list (CLADE.acc, named after the clade list) for the --accessions and --clade options of the other scripts.', epilog='Run again after the missing records are merged into the gb file (mergegb.py) to map them to their clades.')
+parser.add_argument("-i", "--index", metavar='STR', help="index of the input gb file from indexgb.py; a missing gb file and index are treated as empty [input file name.idx]", type=str)
+parser.add_argument("-m", "--missing", metavar='STR', help="output file name for the accessions to download [input file name.missing]", type=str)
+parser.add_argument("-o", "--output", metavar='STR', help="output directory for the accession lists of the clades [directory of each clade list]", type=str)
+parser.add_argument("-s", "--silent", help="run script in silent mode", action='store_true')
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("input", help="input shared gb file", type=str)
+required.add_argument("clade", help="accession list of each clade, one per line; the clade is named after the file name without its extension", type=str, nargs='+')
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set input and output names
+# ============================================================
+
+if not args.index:
+    args.index = gbtools.index_name(args.input)
+if not args.missing:
+    args.missing = args.input+'.missing'
+if os.path.exists(args.input) and not os.path.exists(args.index):
+    error('index '+args.index+' not found; run indexgb.py first', 1)
+if args.output and not os.path.isdir(args.output):
+    error('output directory '+args.output+' not found', 1)
+for clade_file in args.clade:
+    if not os.path.exists(clade_file):
+        error('clade list '+clade_file+' not found', 1)
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.index) if os.path.exists(args.index) else None)
+
+
+# Set variables
+# ============================================================
+
+live_id_dict = {}
+missing_dict = {}
+clade_count_dict = {}
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Read the latest indexed version of each accession
+# ============================================================
+
+run_metrics.phase('read index')
+if os.path.exists(args.index):
+    for entry in run_metrics.counted(gbtools.read_index(args.index)):
+        accession, version = gbtools.split_version(entry.id)
+        if accession not in live_id_dict or version > gbtools.split_version(live_id_dict[accession])[1]:
+            live_id_dict[accession] = entry.id
+
+
+# Map the accessions of each clade to the indexed ids, listing accessions missing from the gb file or newer than
+# the indexed version for download
+# ============================================================
+
+run_metrics.phase('map')
+for clade_file in args.clade:
+    clade_name = os.path.splitext(os.path.basename(clade_file))[0]
+    clade_dir = args.output or os.path.dirname(clade_file)
+    if os.path.abspath(os.path.join(clade_dir, clade_name+'.acc')) == os.path.abspath(clade_file):
+        error('clade list '+clade_file+' would be overwritten by its accession list; rename it or set --output', 1)
+    clade_ids = set()
+    clade_missing_count = 0
+    for accession_id in sorted(gbtools.read_accessions(clade_file)):
+        accession, version = gbtools.split_version(accession_id)
+        if accession in live_id_dict:
+            clade_ids.add(live_id_dict[accession])
+        if accession not in live_id_dict or version > gbtools.split_version(live_id_dict[accession])[1]:
+            missing_dict[accession] = max(missing_dict.get(accession, accession_id), accession_id, key=lambda x: gbtools.split_version(x)[1])
+            clade_missing_count += 1
+    run_metrics.count(len(clade_ids))
+    out_clade = open(os.path.join(clade_dir, clade_name+'.acc'), 'w')
+    for record_id in sorted(clade_ids):
+        out_clade.write(record_id+'\n')
+    out_clade.close()
+    clade_count_dict[clade_name] = (len(clade_ids), clade_missing_count)
+
+
+# Write out the accessions to download
+# ============================================================
+
+run_metrics.phase('write')
+out_missing = open(args.missing, 'w')
+for accession in sorted(missing_dict):
+    out_missing.write(missing_dict[accession]+'\n')
+out_missing.close()
+if not args.silent:
+    for clade_name, (found_count, missing_count) in sorted(clade_count_dict.iteritems()):
+        sys.stderr.write("Clade "+clade_name+": "+str(found_count)+" records in the gb file; "+str(missing_count)+" accessions missing or outdated.\n")
+    sys.stderr.write("Accessions to download: "+str(len(missing_dict))+".\n")
+run_metrics.close()
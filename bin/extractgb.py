@@ -30,19 +30,25 @@
 # ============================================================
 
 import argparse, os, sys
-from Bio import SeqIO
+import gbtools, metrics
 
 
 # Parse arguments
 # ============================================================
 
-parser = argparse.ArgumentParser(description='This script reads through a list of GenBank entries, extracts the gene entry for each species matching the key with (1) the longest gene sequence and (2) the longest total sequence, and then writes out the fasta file for the gene. GenBank entries are skipped if no gene entries matching the gene sequence are found. All entries in the key are assumed to be from the same gene.')
+parser = argparse.ArgumentParser(description='This script reads through a list of GenBank entries, extracts the gene entry for each species matching the key with (1) the longest gene sequence and (2) the longest total sequence, and then writes out one multi-fasta file for each gene (output.GENE.fa) with a samtools-style index of each species (output.GENE.fa.fai). GenBank entries are skipped if no gene entries matching the gene sequence are found. All entries in a key are assumed to be from the same gene; multiple keys (or directories of .key files) are extracted together in a single pass over the gb file.')
+parser.add_argument("-a", "--accessions", metavar='STR', help="file of accessions to consider, one per line; records are fetched through the index [all]", type=str)
+parser.add_argument("-i", "--index", metavar='STR', help="index of the input gb file from indexgb.py; entries are selected from the index and only the chosen records are read [none]", type=str)
 parser.add_argument("-s", "--silent", help="run script in silent mode", action='store_true')
 parser.add_argument("-l", "--log", metavar='STR', help="output file name for log of species extracted [stderr]", type=str, default='stderr')
 parser.add_argument("-o", "--output", metavar='STR', help="output prefix for fasta files [sequence]", type=str, default='sequence')
+parser.add_argument("-p", "--split", help="write one fasta file per species (output#.GENE.fa) instead of one multi-fasta file per gene", action='store_true')
+parser.add_argument("-t", "--table", metavar='STR', help="output file name for a provenance table of the extracted genes in log order (species, accession, gene, 1-based start, end, strand, gene length, record length) [none]", type=str)
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
 parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
 required = parser.add_argument_group('required arguments')
-required.add_argument("gene_key", help="gene names key", type=str)
+required.add_argument("gene_key", help="gene names key(s) or directories of .key files", type=str, nargs='+')
 required.add_argument("input", help="input gb file", type=str)
 args = parser.parse_args()
 
@@ -50,187 +56,79 @@ args = parser.parse_args()
 # Set input and output files
 # ============================================================
 
-in_gb = open(args.input, 'r')
 out_log = sys.stderr
 if args.log != 'stderr':
     out_log = open(args.log, 'w')
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.input))
+accessions = None
+if args.accessions:
+    accessions = gbtools.read_accessions(args.accessions)
+skip_log = None if args.silent else out_log
 
 
 # Set variables
 # ============================================================
 
-gene_names = []
-gene_dict = {}
-full_len_dict = {}
-gene_len_dict = {}
-ids_dict = {}
-id_seen = []
-species_seen = []
-final_species_seen = []
-list_features = ['gene','CDS','mRNA','rRNA','tRNA']
-
-
-# Function to extract gene fasta
-# ============================================================
-
-def geneextract(temp_count, file_name, test_name, fasta_header, test_seq, start_pos, stop_pos, strand_value):
-    temp_count += 1
-    outfile = open(file_name+"."+test_name+".fa", 'w')
-    if int(strand_value) < 0:
-        gene_seq = test_seq[int(start_pos):int(stop_pos)].reverse_complement()
-    else:
-        gene_seq = test_seq[int(start_pos):int(stop_pos)]
-    outfile.write('>'+fasta_header+'\n')
-    outfile.write(str(gene_seq)+'\n')
-    outfile.close()
-    return temp_count
+selection_dict = {}
+seq_dict = {}
 
 
 ###############################################################################
 # Run
 ###############################################################################
 
-# Set existing and ignore names
+# Set existing and ignore names for each key
 # ============================================================
 
-First_line = True
-for line in open(args.gene_key, 'r'):
-    if not line.startswith('GB_name'):
-        line = line.upper().rstrip()
-        if First_line:
-            initial_name = line
-            First_line = False
-        gene_names.append(line)
-        gene_dict[line] = initial_name
+run_metrics.phase('keys')
+gene_dict, gene_order = gbtools.read_keys(args.gene_key, skip_log)
 
 
-# Parse input gb file
+# Select entries from the index and read only the gene sequences of the chosen records from the gb file
 # ============================================================
 
-for record in SeqIO.parse(in_gb, "gb"):
-
-    # Skip entries with duplicate accession numbers.
-    # ============================================================
-
-    if record.id in id_seen:
-        if not args.silent:
-            out_log.write("Skipping duplicate entry for accession "+record.id+".\n")
-
-    # Skip entries without a species name.
-    # ============================================================
-
-    elif 'organism' not in record.annotations:
-        if not args.silent:
-            out_log.write("Skipping entry for accession "+record.id+" as species name is missing.\n")
-
-    # Skip entries with cf., sp., aff., or environmental in the species name.
-    # ============================================================
-
-    elif 'cf.' in record.annotations['organism'] or 'sp.' in record.annotations['organism'] or 'aff.' in record.annotations['organism'] or 'environmental' in record.annotations['organism']:
-        if not args.silent:
-            out_log.write("Skipping entry for species "+record.annotations['organism']+" with accession "+record.id+".\n")
-
-    # Skip entries that only contain N's.
-    # ============================================================
-
-    elif record.seq.count('N') == len(record.seq):
-        if not args.silent: 
-            out_log.write("Skipping entry for accession "+record.id+" as the sequence only contains N's.\n")
-
-    else:
-        id_seen.append(record.id)
-        species_name = '_'.join(record.annotations['organism'].split(' ')[0:2])
-
-        # Count number of annotations matching genes
-        # ============================================================
-
-        query_length = False
-        for feature in record.features:
-            if feature.type in list_features:
-                if 'gene' in feature.qualifiers and feature.qualifiers['gene'][0].upper() in gene_names:
-                    query_length = feature.location.nofuzzy_end - feature.location.nofuzzy_start
-                    break
-                elif 'product' in feature.qualifiers and feature.qualifiers['product'][0].upper() in gene_names:
-                    query_length = feature.location.nofuzzy_end - feature.location.nofuzzy_start
-                    break
-
-        # Replace old entry if new has (1) a longer gene sequence and (2) a longer total sequence
-        # ============================================================
-
-        length_full_seq_query = len(record.seq)
-        if species_name in species_seen and (query_length > gene_len_dict[species_name] or (query_length == gene_len_dict[species_name] and length_full_seq_query > full_len_dict[species_name])):
-            gene_len_dict[species_name] = query_length
-            full_len_dict[species_name] = len(record.seq)
-            ids_dict[species_name] = record.id
-
-        # Add new entry if species has not been previously seen
-        # ============================================================
-
-        elif species_name not in species_seen and query_length:
-            species_seen.append(species_name)
-            gene_len_dict[species_name] = query_length
-            full_len_dict[species_name] = len(record.seq)
-            ids_dict[species_name] = record.id
+if args.index:
+    run_metrics.phase('select')
+    selection_dict, selected_entries = gbtools.select_genes(run_metrics.counted(gbtools.read_index(args.index)), gene_dict, accessions, skip_log)
+    run_metrics.phase('slice')
+    seq_dict = gbtools.slice_genes(args.input, selection_dict, selected_entries, gene_dict)
+    run_metrics.count(len(selected_entries))
 
 
-# Write list of final accession numbers for gene extraction
+# Parse input gb file in a single pass
 # ============================================================
 
-final_ids = []
-out_log.write("Extracting a total of "+str(len(species_seen))+" species.\n")
-for species_name in species_seen:
-    final_ids.append(ids_dict[species_name])
-
-
-# Go to top of input gb file
-# ============================================================
+else:
+    run_metrics.phase('parse')
+    id_seen = set()
+    record_count = 0
+    for record in gbtools.parse_records(args.input, accessions=accessions):
+        record_count += 1
+        run_metrics.count(1, len(record.features))
+        species_name = gbtools.check_entry(record.id, record.annotations.get('organism'), lambda: record.seq.count('N') == len(record.seq), id_seen, skip_log)
+        if not species_name:
+            continue
+
+        # Find the first annotation matching each gene; only the gene slice of the current best entry is held
+        # ============================================================
 
-in_gb.seek(0)
-count = 0
+        for gene_name, feature in gbtools.find_features(record, gene_dict).items():
+            if gbtools.keep_gene(selection_dict, (species_name, gene_name),
+                                 gbtools.GeneSelection(record.id, record_count, feature.location.nofuzzy_end - feature.location.nofuzzy_start, len(record.seq),
+                                                       int(feature.location.start), int(feature.location.end), feature.strand or 0)):
+                seq_dict[(species_name, gene_name)] = gbtools.gene_slice(record.seq, feature.location.start, feature.location.end, feature.strand)
 
 
-# Parse input gb file
+# Write out the fasta sequence and provenance for each species and gene in input order
 # ============================================================
 
-for record in SeqIO.parse(in_gb, "gb"):
+run_metrics.phase('write')
+gbtools.write_genes(selection_dict, seq_dict, gene_order, args.output, out_log, args.table, args.split)
 
-    # If accession number is in the list of final accession numbers for gene extraction
-    # ============================================================
-
-    if record.id in final_ids:
-        count += 1
-        species_name = '_'.join(record.annotations['organism'].split(' ')[0:2])
-        out_log.write(str(count)+'\t'+species_name+'\t'+ids_dict[species_name]+'\n')
-
-        # Write out the fasta sequence for each gene
-        # ============================================================
 
-        temp_features = 0
-        for feature in record.features:
-            run_geneextract = False
-            if feature.type in list_features:
-                if 'gene' in feature.qualifiers and feature.qualifiers['gene'][0].upper() in gene_names:
-                    temp_gene = feature.qualifiers['gene'][0].upper()
-                    if temp_gene in gene_dict:
-                        temp_gene = gene_dict[temp_gene]
-                    run_geneextract = True
-                elif 'product' in feature.qualifiers and feature.qualifiers['product'][0].upper() in gene_names:
-                    temp_gene = feature.qualifiers['product'][0].upper()
-                    if temp_gene in gene_dict:
-                        temp_gene = gene_dict[temp_gene]
-                    run_geneextract = True
-            
-            # Running the extract gene fasta function
-            # ============================================================
-
-            if run_geneextract:
-                temp_features = geneextract(temp_features, args.output+str(count), temp_gene, species_name, record.seq, feature.location.start, feature.location.end, feature.strand)
-                break
-
-
-# Close input and output files
+# Close output files
 # ============================================================
 
-in_gb.close()
 if args.log != 'stderr':
     out_log.close()
+run_metrics.close()
@@ -0,0 +1,871 @@
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import glob, gzip, os, re, string, struct, sys
+from Bio import SeqIO, bgzf
+from cStringIO import StringIO
+from collections import namedtuple
+
+
+# Set variables
+# ============================================================
+
+IndexRecord = namedtuple('IndexRecord', ['id', 'offset', 'length', 'organism', 'seq_length', 'all_n', 'features', 'origin'])
+IndexFeature = namedtuple('IndexFeature', ['type', 'start', 'end', 'strand', 'gene', 'product'])
+GeneSelection = namedtuple('GeneSelection', ['id', 'order', 'gene_length', 'record_length', 'start', 'end', 'strand'])
+list_features = set(['gene','CDS','mRNA','rRNA','tRNA'])
+complement_table = string.maketrans('ACGTMRWSYKVHDBXNacgtmrwsykvhdbxn', 'TGCAKYWSRMBDHVXNtgcakywsrmbdhvxn')
+location_token = re.compile(r'complement\(|join\(|order\(|\)|,|<?\d+\.\.>?\d+|\d+\^\d+|[<>]?\d+')
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+# Function to return the default index file name for a gb file
+# ============================================================
+
+def index_name(gb_file):
+    return gb_file+'.idx'
+
+
+# Function to identify a gb file as plain text, gzip, or BGZF (blocked gzip)
+# ============================================================
+
+def gb_format(gb_file):
+    if gb_file == '-':
+        return 'plain'
+    magic = open(gb_file, 'rb').read(14)
+    if magic[:4] == '\x1f\x8b\x08\x04' and magic[12:14] == 'BC':
+        return 'bgzf'
+    elif magic[:2] == '\x1f\x8b':
+        return 'gzip'
+    return 'plain'
+
+
+# Function to open a plain, gzip, or BGZF gb file for reading
+# ============================================================
+
+def open_gb(gb_file):
+    file_format = gb_format(gb_file)
+    if file_format == 'bgzf':
+        return bgzf.BgzfReader(gb_file, 'rb')
+    elif file_format == 'gzip':
+        return gzip.open(gb_file, 'rb')
+    elif gb_file == '-':
+        return sys.stdin
+    return open(gb_file, 'rb')
+
+
+# Function to read the lines of a gb file with their offsets, optionally within a range of offsets; offsets are
+# byte offsets into the uncompressed text, or virtual offsets for BGZF files
+# ============================================================
+
+def read_lines(gb_file, start=0, end=None):
+    in_gb = open_gb(gb_file)
+    if start:
+        in_gb.seek(start)
+    offset = start
+    if gb_format(gb_file) == 'bgzf':
+        while end is None or offset < end:
+            line = in_gb.readline()
+            if not line:
+                break
+            yield offset, line
+            offset = in_gb.tell()
+    else:
+        for line in in_gb:
+            if end is not None and offset >= end:
+                break
+            yield offset, line
+            offset += len(line)
+    in_gb.close()
+
+
+# Function to return a signature of a file's size and modification time, used to invalidate caches
+# ============================================================
+
+def file_signature(path):
+    status = os.stat(path)
+    return os.path.abspath(path)+'\t'+str(status.st_size)+'\t'+repr(status.st_mtime)
+
+
+# Function to split a gb file into raw records with offsets and lengths
+# ============================================================
+
+def raw_records(gb_file, start=0, end=None):
+    record_start = None
+    lines = []
+    for offset, line in read_lines(gb_file, start, end):
+        if record_start is None and line.startswith('LOCUS'):
+            record_start = offset
+        if record_start is not None:
+            lines.append(line)
+        if record_start is not None and line.startswith('//'):
+            raw = ''.join(lines)
+            yield record_start, len(raw), raw
+            record_start = None
+            lines = []
+
+
+# Function to read one raw record from a gb file by its offset and length
+# ============================================================
+
+def read_record(in_gb, offset, length):
+    in_gb.seek(offset)
+    return SeqIO.read(StringIO(in_gb.read(length)), "gb")
+
+
+# Function to summarize a parsed record for the index
+# ============================================================
+
+def summarize_record(record, offset, length):
+    features = []
+    for feature in record.features:
+        strand = feature.location.strand
+        if strand is None:
+            strand = 0
+        features.append(IndexFeature(feature.type, int(feature.location.start), int(feature.location.end), strand,
+                                     feature.qualifiers['gene'][0] if 'gene' in feature.qualifiers else None,
+                                     feature.qualifiers['product'][0] if 'product' in feature.qualifiers else None))
+    return IndexRecord(record.id, offset, length, record.annotations.get('organism', ''), len(record.seq),
+                       record.seq.count('N') == len(record.seq), features, None)
+
+
+# Function to convert a feature location string into its start, end, and strand
+# ============================================================
+
+def parse_location(location):
+    parts = []
+    open_list = []
+    complement_level = 0
+    position = 0
+    for match in location_token.finditer(location):
+        if match.start() != position:
+            raise ValueError('unsupported location '+location)
+        token = match.group(0)
+        strand = -1 if complement_level % 2 else 1
+        if token == 'complement(':
+            open_list.append(True)
+            complement_level += 1
+        elif token == 'join(' or token == 'order(':
+            open_list.append(False)
+        elif token == ')':
+            if open_list.pop():
+                complement_level -= 1
+        elif '..' in token:
+            start, end = [int(x.lstrip('<>')) for x in token.split('..')]
+            if start > end:
+                raise ValueError('unsupported location '+location)
+            parts.append((start - 1, end, strand))
+        elif '^' in token:
+            start = int(token.split('^')[0])
+            parts.append((start, start, strand))
+        elif token != ',':
+            start = int(token.lstrip('<>'))
+            parts.append((start - 1, start, strand))
+        position = match.end()
+    if position != len(location) or open_list or not parts:
+        raise ValueError('unsupported location '+location)
+    strands = set([x[2] for x in parts])
+    return min([x[0] for x in parts]), max([x[1] for x in parts]), strands.pop() if len(strands) == 1 else 0
+
+
+# Function to convert the lines of a feature into its summary, keeping only the gene and product qualifiers
+# ============================================================
+
+def parse_feature(feature_type, lines):
+    lines = [x for x in lines if x]
+    location = lines.pop(0)
+    while location.endswith(','):
+        location += lines.pop(0)
+    qualifiers = {}
+    while lines:
+        line = lines.pop(0)
+        if not line.startswith('/'):
+            continue
+        if '=' not in line:
+            qualifiers.setdefault(line[1:], '')
+            continue
+        key, value = line[1:].split('=', 1)
+        if value.startswith('"') and value != '"':
+            value_list = [value]
+            while not value_list[-1].endswith('"'):
+                value_list.append(lines.pop(0))
+            value = ' '.join(value_list)
+        if key not in qualifiers:
+            qualifiers[key] = re.sub('^"|"$', '', value).replace('""', '"')
+    start, end, strand = parse_location(location)
+    return IndexFeature(feature_type, start, end, strand, qualifiers.get('gene'), qualifiers.get('product'))
+
+
+# Function to scan the header and features of each record without building the sequence, falling back to
+# Biopython for records the scanner cannot read
+# ============================================================
+
+def scan_records(gb_file, start=0, end=None, check_n=False):
+    fallback_gb = None
+    record_start = None
+    for line_offset, line in read_lines(gb_file, start, end):
+
+        # Start a new record at the LOCUS line
+        # ============================================================
+
+        if record_start is None:
+            if line.startswith('LOCUS'):
+                record_start = line_offset
+                record_length = 0
+                section = 'header'
+                malformed = False
+                tokens = line.split()
+                locus_name = tokens[1] if len(tokens) > 1 else ''
+                seq_length = 0
+                for i in range(2, len(tokens)):
+                    if tokens[i] in ('bp', 'aa') and tokens[i-1].isdigit():
+                        seq_length = int(tokens[i-1])
+                accession = None
+                version = None
+                organism = ''
+                organism_open = False
+                lineage = False
+                features = []
+                feature_type = None
+                feature_lines = []
+                all_n = True
+                origin = None
+            else:
+                continue
+        record_length += len(line)
+
+        # Finish the record at the // line
+        # ============================================================
+
+        if line.startswith('//'):
+            if not malformed and feature_type is not None:
+                try:
+                    features.append(parse_feature(feature_type, feature_lines))
+                except (IndexError, ValueError):
+                    malformed = True
+            if malformed:
+                if fallback_gb is None:
+                    fallback_gb = open_gb(gb_file)
+                yield summarize_record(read_record(fallback_gb, record_start, record_length), record_start, record_length)
+            else:
+                if version and version.count('.') == 1 and version.split('.')[1].isdigit():
+                    record_id = (accession or version.split('.')[0])+'.'+version.split('.')[1]
+                else:
+                    record_id = version or accession or locus_name
+                yield IndexRecord(record_id, record_start, record_length, organism, seq_length, all_n, features, origin)
+            record_start = None
+            continue
+        if malformed:
+            continue
+
+        # Read the accession, version, and species name from the header
+        # ============================================================
+
+        if section == 'header':
+            key = line[:12].strip()
+            if line.startswith('FEATURES'):
+                section = 'features'
+            elif line.startswith('ORIGIN'):
+                section = 'origin'
+                origin = record_length
+            elif line.startswith('CONTIG') or line.startswith('BASE COUNT'):
+                section = 'tail'
+            elif key == 'ACCESSION' and accession is None and line[12:].split():
+                accession = line[12:].replace(';', ' ').split()[0]
+            elif key == 'VERSION' and line[12:].split():
+                version = line[12:].split()[0]
+            elif key == 'ORGANISM':
+                organism = line[12:].strip()
+                organism_open = True
+                continue
+            elif organism_open and line.startswith(' ' * 12):
+                if lineage or ';' in line:
+                    lineage = True
+                elif line[12:].strip() != '.':
+                    organism += ' '+line[12:].strip()
+                continue
+            organism_open = False
+
+        # Collect the lines of each feature
+        # ============================================================
+
+        elif section == 'features':
+            if not line.startswith(' '):
+                if feature_type is not None:
+                    try:
+                        features.append(parse_feature(feature_type, feature_lines))
+                    except (IndexError, ValueError):
+                        malformed = True
+                feature_type = None
+                section = 'origin' if line.startswith('ORIGIN') else 'tail'
+                if section == 'origin':
+                    origin = record_length
+            elif line.startswith(' ' * 21) or not line.strip():
+                feature_lines.append(line[21:].strip())
+            elif line[21:22] != ' ':
+                if feature_type is not None:
+                    try:
+                        features.append(parse_feature(feature_type, feature_lines))
+                    except (IndexError, ValueError):
+                        malformed = True
+                feature_type = line[2:21].strip()
+                feature_lines = [line[21:].strip()]
+            else:
+                malformed = True
+
+        # Skip over the sequence, only checking if it is all N's when requested
+        # ============================================================
+
+        elif section == 'origin':
+            if check_n and all_n and line.translate(None, '0123456789 \t\r\nnN'):
+                all_n = False
+        elif line.startswith('ORIGIN'):
+            section = 'origin'
+            origin = record_length
+    if fallback_gb is not None:
+        fallback_gb.close()
+
+
+# Function to write out the index of a gb file, or of the given records of a gb file
+# ============================================================
+
+def write_index(gb_file, index_file, entries=None):
+    if entries is None:
+        entries = scan_records(gb_file, check_n=True)
+    out_idx = open(index_file, 'w')
+    for entry in entries:
+        out_idx.write('>'+'\t'.join([entry.id, str(entry.offset), str(entry.length), entry.organism,
+                                     str(entry.seq_length), str(int(entry.all_n)), '' if entry.origin is None else str(entry.origin)])+'\n')
+        for feature in entry.features:
+            out_idx.write('\t'.join([feature.type, str(feature.start), str(feature.end), str(feature.strand),
+                                     feature.gene or '', feature.product or ''])+'\n')
+    out_idx.close()
+
+
+# Function to read the index of a gb file in input order
+# ============================================================
+
+def read_index(index_file):
+    entry = None
+    for line in open(index_file, 'r'):
+        line = line.rstrip('\n').split('\t')
+        if line[0].startswith('>'):
+            if entry is not None:
+                yield entry
+            entry = IndexRecord(line[0][1:], int(line[1]), int(line[2]), line[3], int(line[4]), line[5] == '1', [],
+                                int(line[6]) if len(line) > 6 and line[6] else None)
+        else:
+            entry.features.append(IndexFeature(line[0], int(line[1]), int(line[2]), int(line[3]), line[4] or None, line[5] or None))
+    if entry is not None:
+        yield entry
+
+
+# Function to write a species by gene name presence matrix with one bitset per species in hex, bit i set if the
+# species has gene name i of the header line
+# ============================================================
+
+def write_matrix(matrix_file, species_genes_dictset, gene_names):
+    column_dict = dict((name, i) for i, name in enumerate(gene_names))
+    out_matrix = open(matrix_file, 'w')
+    out_matrix.write('#\t'+'\t'.join(gene_names)+'\n')
+    for species_name in sorted(species_genes_dictset):
+        bits = 0
+        for name in species_genes_dictset[species_name]:
+            bits |= 1 << column_dict[name]
+        out_matrix.write(species_name+'\t'+format(bits, 'x')+'\n')
+    out_matrix.close()
+
+
+# Function to read a presence matrix into its gene names and a dict of species names to bitsets
+# ============================================================
+
+def read_matrix(matrix_file):
+    in_matrix = open(matrix_file, 'r')
+    gene_names = in_matrix.readline().rstrip('\n').split('\t')[1:]
+    species_bits_dict = {}
+    for line in in_matrix:
+        species_name, bits = line.rstrip('\n').split('\t')
+        species_bits_dict[species_name] = int(bits, 16)
+    in_matrix.close()
+    return gene_names, species_bits_dict
+
+
+# Function to read a list of accessions, one per line
+# ============================================================
+
+def read_accessions(accession_file):
+    accessions = set()
+    for line in open(accession_file, 'r'):
+        line = line.strip()
+        if line:
+            accessions.add(line.split('\t')[0])
+    return accessions
+
+
+# Function to split a record id into its accession and version number
+# ============================================================
+
+def split_version(record_id):
+    if record_id.count('.') == 1 and record_id.split('.')[1].isdigit():
+        return record_id.split('.')[0], int(record_id.split('.')[1])
+    return record_id, 0
+
+
+# Function to fetch records from a gb file by random access through the index
+# ============================================================
+
+def fetch_records(gb_file, entries, in_gb=None):
+    close_gb = in_gb is None
+    if close_gb:
+        in_gb = open_gb(gb_file)
+    for entry in sorted(entries, key=lambda x: x.offset):
+        yield read_record(in_gb, entry.offset, entry.length)
+    if close_gb:
+        in_gb.close()
+
+
+# Function to iterate over the records of a gb file, fetching only the listed accessions when an index is given
+# ============================================================
+
+def parse_records(gb_file, index_file=None, accessions=None):
+    if accessions is None:
+        in_gb = open_gb(gb_file)
+        for record in SeqIO.parse(in_gb, "gb"):
+            yield record
+        in_gb.close()
+    else:
+        if index_file is None:
+            index_file = index_name(gb_file)
+        if not os.path.exists(index_file):
+            sys.stderr.write('['+os.path.basename(sys.argv[0])+']: index '+index_file+' not found; run indexgb.py first\n')
+            sys.exit(1)
+        for record in fetch_records(gb_file, [x for x in read_index(index_file) if x.id in accessions]):
+            yield record
+
+
+# Function to list the start of each block of a BGZF file from the block headers
+# ============================================================
+
+def bgzf_blocks(gb_file):
+    in_gb = open(gb_file, 'rb')
+    blocks = []
+    position = 0
+    header = in_gb.read(18)
+    while len(header) == 18:
+        blocks.append(position)
+        position += struct.unpack('<H', header[16:18])[0] + 1
+        in_gb.seek(position)
+        header = in_gb.read(18)
+    in_gb.close()
+    return blocks
+
+
+# Function to split a gb file into ranges of offsets ending on record boundaries; BGZF files are split on block
+# starts so that each shard decompresses its own blocks, and gzip files cannot be split
+# ============================================================
+
+def shard_offsets(gb_file, count):
+    file_format = gb_format(gb_file)
+    if file_format == 'gzip':
+        return [(0, None)]
+    elif file_format == 'bgzf':
+        blocks = bgzf_blocks(gb_file)
+        targets = [blocks[len(blocks) * i // count] << 16 for i in range(1, count)]
+    else:
+        size = os.path.getsize(gb_file)
+        targets = [size * i // count for i in range(1, count)]
+    in_gb = open_gb(gb_file)
+    bounds = [0]
+    for target in targets:
+        if target <= bounds[-1]:
+            continue
+        in_gb.seek(target)
+        in_gb.readline()
+        line = in_gb.readline()
+        while line and not line.startswith('//'):
+            line = in_gb.readline()
+        if not line:
+            break
+        position = in_gb.tell()
+        if position > bounds[-1]:
+            bounds.append(position)
+    in_gb.close()
+    bounds.append(None)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# Function to copy a gb file or stdin into a BGZF file
+# ============================================================
+
+def write_bgzf(gb_file, bgzf_file):
+    in_gb = open_gb(gb_file)
+    out_gb = bgzf.BgzfWriter(bgzf_file, 'wb')
+    data = in_gb.read(1048576)
+    while data:
+        out_gb.write(data)
+        data = in_gb.read(1048576)
+    out_gb.close()
+    if in_gb is not sys.stdin:
+        in_gb.close()
+
+
+# Function to open a plain or BGZF gb file for appending records; returns the handle and the offset of the first
+# appended record. The BGZF end-of-file marker is removed and rewritten when the handle is closed.
+# ============================================================
+
+def append_gb(gb_file):
+    file_format = gb_format(gb_file)
+    if file_format == 'gzip':
+        sys.stderr.write('['+os.path.basename(sys.argv[0])+']: records cannot be appended to gzip file '+gb_file+'; recompress it with indexgb.py --compress\n')
+        sys.exit(1)
+    out_gb = open(gb_file, 'r+b')
+    out_gb.seek(0, 2)
+    if file_format == 'bgzf':
+        out_gb.seek(-len(bgzf._bgzf_eof), 2)
+        if out_gb.read(len(bgzf._bgzf_eof)) == bgzf._bgzf_eof:
+            out_gb.seek(-len(bgzf._bgzf_eof), 2)
+            out_gb.truncate()
+        return bgzf.BgzfWriter(fileobj=out_gb), out_gb.tell() << 16
+    if out_gb.tell():
+        out_gb.seek(-1, 2)
+        if out_gb.read(1) != '\n':
+            out_gb.write('\n')
+    return out_gb, out_gb.tell()
+
+
+# Function to iterate over record summaries, scanning only headers and features when fast is set; with fast and
+# an index, the summaries are read from the index alone
+# ============================================================
+
+def parse_entries(gb_file, index_file=None, accessions=None, fast=False):
+    if fast and accessions is None and index_file is None:
+        for entry in scan_records(gb_file):
+            yield entry
+    elif fast:
+        if index_file is None:
+            index_file = index_name(gb_file)
+        for entry in read_index(index_file):
+            if accessions is None or entry.id in accessions:
+                yield entry
+    else:
+        for record in parse_records(gb_file, index_file, accessions):
+            yield summarize_record(record, 0, 0)
+
+
+# Function to read gene name keys, or directories of .key files, into a dict of names to the first name of each key
+# and a list of the first names in key order; names already assigned to another key are skipped
+# ============================================================
+
+def read_keys(key_paths, log=None):
+    gene_dict = {}
+    gene_order = []
+    key_files = []
+    for key_path in key_paths:
+        if os.path.isdir(key_path):
+            key_files.extend(sorted(glob.glob(os.path.join(key_path, '*.key'))))
+        else:
+            key_files.append(key_path)
+    for key_file in key_files:
+        initial_name = None
+        for line in open(key_file, 'r'):
+            if not line.startswith('GB_name'):
+                line = line.upper().rstrip()
+                if initial_name is None:
+                    initial_name = line
+                    if initial_name not in gene_order:
+                        gene_order.append(initial_name)
+                if line in gene_dict and gene_dict[line] != initial_name:
+                    if log is not None:
+                        log.write("Skipping name "+line+" in key "+key_file+" as it is already assigned to "+gene_dict[line]+".\n")
+                else:
+                    gene_dict[line] = initial_name
+    return gene_dict, gene_order
+
+
+# Function to check if an entry should be skipped; if not, then return the species name. Skipped are duplicate
+# accessions, entries without a species name or with cf., sp., aff., or environmental in the species name, and
+# entries whose sequence only contains N's (all_n is called only if the other checks pass)
+# ============================================================
+
+def check_entry(entry_id, organism, all_n, id_seen, log=None):
+    if entry_id in id_seen:
+        if log is not None:
+            log.write("Skipping duplicate entry for accession "+entry_id+".\n")
+    elif not organism:
+        if log is not None:
+            log.write("Skipping entry for accession "+entry_id+" as species name is missing.\n")
+    elif 'cf.' in organism or 'sp.' in organism or 'aff.' in organism or 'environmental' in organism:
+        if log is not None:
+            log.write("Skipping entry for species "+organism+" with accession "+entry_id+".\n")
+    elif all_n():
+        if log is not None:
+            log.write("Skipping entry for accession "+entry_id+" as the sequence only contains N's.\n")
+    else:
+        id_seen.add(entry_id)
+        return '_'.join(organism.split(' ')[0:2])
+
+
+# Function to return the key name if a feature matches a key
+# ============================================================
+
+def match_feature(gene_dict, feature_type, gene_value, product_value):
+    if feature_type in list_features:
+        if gene_value and gene_value.upper() in gene_dict:
+            return gene_dict[gene_value.upper()]
+        elif product_value and product_value.upper() in gene_dict:
+            return gene_dict[product_value.upper()]
+
+
+# Function to find the first feature of a parsed record matching each key
+# ============================================================
+
+def find_features(record, gene_dict):
+    found_dict = {}
+    for feature in record.features:
+        gene_name = match_feature(gene_dict, feature.type, feature.qualifiers['gene'][0] if 'gene' in feature.qualifiers else None,
+                                  feature.qualifiers['product'][0] if 'product' in feature.qualifiers else None)
+        if gene_name and gene_name not in found_dict:
+            found_dict[gene_name] = feature
+    return found_dict
+
+
+# Function to keep a gene of an entry if the species has not been previously seen for the gene or the new entry
+# has (1) a longer gene sequence and (2) a longer total sequence
+# ============================================================
+
+def keep_gene(selection_dict, species_gene, selection):
+    if not selection.gene_length:
+        return False
+    previous = selection_dict.get(species_gene)
+    if previous is None or selection.gene_length > previous.gene_length or (selection.gene_length == previous.gene_length and selection.record_length > previous.record_length):
+        selection_dict[species_gene] = selection
+        return True
+    return False
+
+
+# Function to select the entry for each species and gene from index entries, numbering entries in input order;
+# returns the selections and the index entries of the selected records
+# ============================================================
+
+def select_genes(entries, gene_dict, accessions=None, log=None):
+    selection_dict = {}
+    entry_dict = {}
+    id_seen = set()
+    record_count = 0
+    for entry in entries:
+        record_count += 1
+        if accessions is not None and entry.id not in accessions:
+            continue
+        species_name = check_entry(entry.id, entry.organism, lambda: entry.all_n, id_seen, log)
+        if not species_name:
+            continue
+        genes_record_seen = set()
+        for feature in entry.features:
+            gene_name = match_feature(gene_dict, feature.type, feature.gene, feature.product)
+            if gene_name and gene_name not in genes_record_seen:
+                genes_record_seen.add(gene_name)
+                if keep_gene(selection_dict, (species_name, gene_name), GeneSelection(entry.id, record_count, feature.end - feature.start,
+                                                                                     entry.seq_length, feature.start, feature.end, feature.strand)):
+                    entry_dict[entry.id] = entry
+    selected_ids = set([x.id for x in selection_dict.itervalues()])
+    return selection_dict, [x for x in entry_dict.itervalues() if x.id in selected_ids]
+
+
+# Function to return a gene sequence, reverse complemented on the minus strand
+# ============================================================
+
+def gene_slice(seq, start, end, strand):
+    if int(strand) < 0:
+        return str(seq[int(start):int(end)].reverse_complement())
+    return str(seq[int(start):int(end)])
+
+
+# Function to slice the selected genes from parsed records
+# ============================================================
+
+def fetch_genes(records, selection_dict, gene_dict):
+    seq_dict = {}
+    species_genes_by_id = {}
+    for species_gene, selection in selection_dict.iteritems():
+        species_genes_by_id.setdefault(selection.id, []).append(species_gene)
+    for record in records:
+        found_dict = find_features(record, gene_dict)
+        for species_gene in species_genes_by_id.get(record.id, []):
+            feature = found_dict[species_gene[1]]
+            seq_dict[species_gene] = gene_slice(record.seq, feature.location.start, feature.location.end, feature.strand)
+    return seq_dict
+
+
+# Function to read a byte range of a record from an open gb file; BGZF virtual offsets cannot be added to, so the
+# bytes before the range are skipped in blocks
+# ============================================================
+
+def read_bytes(in_gb, offset, skip, size):
+    if not isinstance(in_gb, bgzf.BgzfReader):
+        in_gb.seek(offset + skip)
+        return in_gb.read(size)
+    in_gb.seek(offset)
+    while skip > 0:
+        block = in_gb.read(min(skip, 1048576))
+        if not block:
+            return ''
+        skip -= len(block)
+    return in_gb.read(size)
+
+
+# Function to return a gene sequence read from the ORIGIN block of a record, reading only the lines covering the
+# coordinates; returns None if the record has no ORIGIN offset in the index or the lines do not have the standard
+# layout of 60 bases per line after a right-justified line number of constant width
+# ============================================================
+
+def origin_slice(in_gb, entry, start, end, strand):
+    if entry.origin is None or start < 0 or start >= end or end > entry.seq_length:
+        return None
+    first_line = read_bytes(in_gb, entry.offset, entry.origin, 128)
+    number = re.match(r' *1 ', first_line)
+    if not number:
+        return None
+    prefix = len(number.group(0))
+    line_length = prefix + 66
+    if entry.seq_length > 60:
+        if '\n' not in first_line:
+            return None
+        line_length = first_line.index('\n') + 1
+        if line_length not in (prefix + 66, prefix + 67):
+            return None
+    first = start // 60
+    last = (end - 1) // 60
+    if len(str(60 * last + 1)) >= prefix:
+        return None
+    chunk = read_bytes(in_gb, entry.offset, entry.origin + first * line_length, (last - first + 1) * line_length)
+    if not chunk.startswith(str(60 * first + 1).rjust(prefix - 1)+' ') or not chunk[(last - first) * line_length:].startswith(str(60 * last + 1).rjust(prefix - 1)+' '):
+        return None
+    bases = chunk.translate(None, '0123456789 \t\r\n')
+    if len(bases) < end - 60 * first:
+        return None
+    seq = bases[start - 60 * first:end - 60 * first].upper()
+    if int(strand) < 0:
+        return seq.translate(complement_table)[::-1]
+    return seq
+
+
+# Function to slice the selected genes from the ORIGIN blocks of their records in file order, so that only the
+# bytes covering each gene are read; records without an ORIGIN offset or with a non-standard layout are parsed
+# ============================================================
+
+def slice_genes(gb_file, selection_dict, entries, gene_dict, in_gb=None):
+    entry_dict = dict((x.id, x) for x in entries)
+    seq_dict = {}
+    fallback_dict = {}
+    close_gb = in_gb is None
+    if close_gb:
+        in_gb = open_gb(gb_file)
+    for species_gene, selection in sorted(selection_dict.iteritems(), key=lambda x: (entry_dict[x[1].id].offset, x[1].start)):
+        gene_seq = origin_slice(in_gb, entry_dict[selection.id], selection.start, selection.end, selection.strand)
+        if gene_seq is None:
+            fallback_dict[species_gene] = selection
+        else:
+            seq_dict[species_gene] = gene_seq
+    if fallback_dict:
+        fallback_entries = dict((x.id, entry_dict[x.id]) for x in fallback_dict.itervalues()).values()
+        seq_dict.update(fetch_genes(fetch_records(gb_file, fallback_entries, in_gb), fallback_dict, gene_dict))
+    if close_gb:
+        in_gb.close()
+    return seq_dict
+
+
+# Function to write out the gene fasta sequences of each species in input order, one multi-fasta file and its
+# index per gene or one file per species, along with the log of species extracted and an optional provenance table
+# (species, accession, gene, 1-based start, end, strand, gene length, record length)
+# ============================================================
+
+def write_genes(selection_dict, seq_dict, gene_order, output, log, table=None, split=False):
+    if table:
+        out_table = open(table, 'w')
+    for gene_name in gene_order:
+        species_genes = sorted([x for x in selection_dict if x[1] == gene_name], key=lambda x: selection_dict[x].order)
+        if len(gene_order) > 1:
+            log.write("Extracting a total of "+str(len(species_genes))+" species for "+gene_name+".\n")
+        else:
+            log.write("Extracting a total of "+str(len(species_genes))+" species.\n")
+        if not split:
+            out_fasta = open(output+'.'+gene_name+'.fa', 'w', 1048576)
+            out_fasta_index = open(output+'.'+gene_name+'.fa.fai', 'w')
+            fasta_offset = 0
+        count = 0
+        for species_gene in species_genes:
+            count += 1
+            selection = selection_dict[species_gene]
+            if len(gene_order) > 1:
+                log.write(str(count)+'\t'+species_gene[0]+'\t'+selection.id+'\t'+gene_name+'\n')
+            else:
+                log.write(str(count)+'\t'+species_gene[0]+'\t'+selection.id+'\n')
+            if table:
+                out_table.write('\t'.join([species_gene[0], selection.id, gene_name, str(selection.start + 1), str(selection.end),
+                                           str(selection.strand), str(selection.gene_length), str(selection.record_length)])+'\n')
+            gene_seq = seq_dict[species_gene]
+            if split:
+                out_fasta = open(output+str(count)+'.'+gene_name+'.fa', 'w')
+                out_fasta.write('>'+species_gene[0]+'\n'+gene_seq+'\n')
+                out_fasta.close()
+            else:
+                out_fasta.write('>'+species_gene[0]+'\n'+gene_seq+'\n')
+                fasta_offset += len(species_gene[0]) + 2
+                out_fasta_index.write(species_gene[0]+'\t'+str(len(gene_seq))+'\t'+str(fasta_offset)+'\t'+str(len(gene_seq))+'\t'
+                                      +str(len(gene_seq) + 1)+'\n')
+                fasta_offset += len(gene_seq) + 1
+        if not split:
+            out_fasta.close()
+            out_fasta_index.close()
+    if table:
+        out_table.close()
+
+
+# Function to list the first accession and feature type of each gene name annotated in record summaries
+# ============================================================
+
+def name_inventory(entries):
+    inventory = []
+    inventory_names_seen = set()
+    for entry in entries:
+        for feature in entry.features:
+            if feature.type in list_features:
+                if feature.gene is not None:
+                    name = feature.gene.upper()
+                elif feature.product is not None:
+                    name = feature.product.upper()
+                else:
+                    continue
+                if name not in inventory_names_seen:
+                    inventory_names_seen.add(name)
+                    inventory.append([entry.id, name, feature.type])
+    return inventory
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, sys, threading, time, traceback
+import gbtools, jobqueue, metrics
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script runs a long-lived worker that holds the index of a gb file in memory and keeps the gb file open, and runs jobs from a queue directory on shared storage (submitjob.py). Several workers, on the same or different nodes, can drain one queue. Jobs are "extract" (as extractgb.py with --index) and "names" (as genenamesfromgb.py --fast); the index is reloaded when it changes, e.g. after prep.sh -update.')
+parser.add_argument("-i", "--index", metavar='STR', help="index of the input gb file from indexgb.py [input file name.idx]", type=str)
+parser.add_argument("-o", "--once", help="exit when no jobs are pending instead of waiting for new jobs", action='store_true')
+parser.add_argument("-p", "--poll", metavar='FLOAT', help="seconds between checks of the queue when no jobs are pending [5]", type=float, default=5.0)
+parser.add_argument("-r", "--requeue", metavar='FLOAT', help="move running jobs without a heartbeat for this many minutes, e.g. of a worker that died, back to pending [10]", type=float, default=10.0)
+parser.add_argument("-s", "--silent", help="run script in silent mode", action='store_true')
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("queue", help="queue directory", type=str)
+required.add_argument("input", help="input gb file", type=str)
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set input and output names
+# ============================================================
+
+args.input = os.path.abspath(args.input)
+if not args.index:
+    args.index = gbtools.index_name(args.input)
+if not os.path.exists(args.index):
+    error('index '+args.index+' not found; run indexgb.py first', 1)
+run_metrics = metrics.Metrics(args.metrics, args.profile)
+
+
+# Set variables
+# ============================================================
+
+index_state = {'signature': None, 'entries': [], 'in_gb': None}
+names_cache_dict = {}
+current_job = [None]
+
+
+# Function to return the index entries, reloading the index and reopening the gb file if either changed
+# ============================================================
+
+def indexentries():
+    signature = gbtools.file_signature(args.index)+'\t'+gbtools.file_signature(args.input)
+    if signature != index_state['signature']:
+        if not args.silent:
+            sys.stderr.write("Loading index "+args.index+".\n")
+        if index_state['in_gb'] is not None:
+            index_state['in_gb'].close()
+        index_state['entries'] = list(gbtools.read_index(args.index))
+        index_state['in_gb'] = gbtools.open_gb(args.input)
+        index_state['signature'] = signature
+    return index_state['entries']
+
+
+# Function to return the gene name inventory of a gb file, from the held index for the input gb file and otherwise
+# from a scan of the file cached until it changes
+# ============================================================
+
+def nameinventory(gb_file):
+    if os.path.abspath(gb_file) == args.input:
+        return gbtools.name_inventory(indexentries())
+    signature = gbtools.file_signature(gb_file)
+    if gb_file not in names_cache_dict or names_cache_dict[gb_file][0] != signature:
+        names_cache_dict[gb_file] = (signature, gbtools.name_inventory(gbtools.scan_records(gb_file)))
+    return names_cache_dict[gb_file][1]
+
+
+# Function to run an extract job: the genes of the keys are selected from the held index and sliced from the
+# open gb file
+# ============================================================
+
+def extractjob(fields, job_metrics):
+    if os.path.abspath(jobqueue.job_value(fields, 'input', args.input)) != args.input:
+        raise ValueError('job input '+jobqueue.job_value(fields, 'input')+' is not the gb file '+args.input+' of this worker')
+    out_log = sys.stderr
+    log_file = jobqueue.job_value(fields, 'log', 'stderr')
+    if log_file != 'stderr':
+        out_log = open(log_file, 'w')
+    skip_log = None if jobqueue.job_value(fields, 'silent') == '1' else out_log
+    accessions = None
+    if jobqueue.job_value(fields, 'accessions'):
+        accessions = gbtools.read_accessions(jobqueue.job_value(fields, 'accessions'))
+    job_metrics.phase('keys')
+    gene_dict, gene_order = gbtools.read_keys([x[1] for x in fields if x[0] == 'key'], skip_log)
+    job_metrics.phase('select')
+    selection_dict, selected_entries = gbtools.select_genes(job_metrics.counted(indexentries()), gene_dict, accessions, skip_log)
+    job_metrics.phase('slice')
+    seq_dict = gbtools.slice_genes(args.input, selection_dict, selected_entries, gene_dict, index_state['in_gb'])
+    job_metrics.count(len(selected_entries))
+    job_metrics.phase('write')
+    gbtools.write_genes(selection_dict, seq_dict, gene_order, jobqueue.job_value(fields, 'output', 'sequence'), out_log,
+                        jobqueue.job_value(fields, 'table'), jobqueue.job_value(fields, 'split') == '1')
+    if log_file != 'stderr':
+        out_log.close()
+    return [('species', len(selection_dict))]
+
+
+# Function to run a names job: write out the id and name of each gene name not in the key
+# ============================================================
+
+def namesjob(fields, job_metrics):
+    gene_names = set()
+    for line in open(jobqueue.job_value(fields, 'key'), 'r'):
+        if not line.startswith('GB_name'):
+            gene_names.add(line.upper().rstrip())
+    job_metrics.phase('inventory')
+    inventory = nameinventory(jobqueue.job_value(fields, 'input', args.input))
+    job_metrics.phase('write')
+    out_gene_name = open(jobqueue.job_value(fields, 'output', jobqueue.job_value(fields, 'input', args.input))+'.gene.names', 'w')
+    count = 0
+    for record_id, name, feature_type in inventory:
+        if name not in gene_names:
+            out_gene_name.write(record_id+'\t'+name+'\n')
+            count += 1
+    out_gene_name.close()
+    return [('names', count)]
+
+
+# Function to keep the modification time of the running job current so that it is not requeued
+# ============================================================
+
+def heartbeat():
+    while True:
+        time.sleep(max(1.0, min(60.0, args.requeue * 60 / 4)))
+        job_name = current_job[0]
+        if job_name is not None:
+            try:
+                os.utime(os.path.join(args.queue, 'running', job_name), None)
+            except OSError:
+                pass
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Start the heartbeat and load the index
+# ============================================================
+
+job_dict = {'extract': extractjob, 'names': namesjob}
+heartbeat_thread = threading.Thread(target=heartbeat)
+heartbeat_thread.daemon = True
+heartbeat_thread.start()
+run_metrics.phase('load')
+indexentries()
+
+
+# Claim and run jobs until stopped, or until the queue is empty with --once
+# ============================================================
+
+while True:
+    requeued = jobqueue.requeue_jobs(args.queue, args.requeue * 60)
+    if requeued and not args.silent:
+        sys.stderr.write("Requeued stale jobs "+', '.join(requeued)+".\n")
+    job_name = jobqueue.claim_job(args.queue)
+    if job_name is None:
+        if args.once:
+            break
+        time.sleep(args.poll)
+        continue
+    current_job[0] = job_name
+    run_metrics.phase(job_name)
+    start_time = time.time()
+    fields = jobqueue.read_job(os.path.join(args.queue, 'running', job_name))
+    job_type = jobqueue.job_value(fields, 'type')
+    if not args.silent:
+        sys.stderr.write("Running "+str(job_type)+" job "+job_name+".\n")
+    job_metrics = metrics.Metrics(jobqueue.job_value(fields, 'metrics'))
+    try:
+        if job_type not in job_dict:
+            raise ValueError('unknown job type '+str(job_type))
+        results = job_dict[job_type](fields, job_metrics)
+        status = 'done'
+    except Exception as exception:
+        if not args.silent:
+            traceback.print_exc()
+        results = [('message', type(exception).__name__+': '+str(exception))]
+        status = 'failed'
+    job_metrics.close(status)
+    run_metrics.count(1)
+    current_job[0] = None
+    try:
+        jobqueue.finish_job(args.queue, job_name, status, results + [('seconds', '%.1f' % (time.time() - start_time))])
+    except (IOError, OSError):
+        sys.stderr.write("Job "+job_name+" was requeued while running; its result is not recorded.\n")
+    if not args.silent:
+        sys.stderr.write("Finished job "+job_name+" ("+status+") in "+('%.1f' % (time.time() - start_time))+" seconds.\n")
+
+
+# Close input files
+# ============================================================
+
+if index_state['in_gb'] is not None:
+    index_state['in_gb'].close()
+run_metrics.close()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, sys
+import gbtools, metrics
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script answers species coverage questions for sets of genes from the species by gene name presence matrix of allgenesingb.py (output.genes_matrix) without reading the gb file again. For the given genes, in order, it reports the species with each gene and the species covered by at least --min-genes of the genes so far; with --plan, it then greedily adds the gene covering the most additional species until the plan has the requested number of genes. Annotated names are grouped into genes by gene names keys and, if given, by the synonym clusters of allgenesingb.py.')
+parser.add_argument("-c", "--clusters", metavar='STR', help="synonym clusters from allgenesingb.py (output.genes_name); the names of a cluster count as one gene named after its most common name [none]", type=str)
+parser.add_argument("-g", "--genes", metavar='STR', help="comma-separated genes to report, or to start the plan with [none]", type=str)
+parser.add_argument("-k", "--key", metavar='STR', help="gene names key or directory of .key files; the names of a key count as one gene named after its first name; may be given multiple times [none]", type=str, action='append', default=[])
+parser.add_argument("-m", "--min-genes", metavar='INT', help="genes a species needs to be counted as covered [1]", type=int, default=1)
+parser.add_argument("-o", "--output", metavar='STR', help="output file name for the coverage report [stdout]", type=str, default='stdout')
+parser.add_argument("-p", "--plan", metavar='INT', help="total number of genes to propose by greedily adding the gene that covers the most species [none]", type=int)
+parser.add_argument("-t", "--table", metavar='STR', help="output file name for the number and names of the reported genes present in each species [none]", type=str)
+parser.add_argument("-x", "--exclude", metavar='STR', help="comma-separated genes never proposed by the plan [none]", type=str)
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("matrix", help="presence matrix from allgenesingb.py (output.genes_matrix)", type=str)
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Check arguments
+# ============================================================
+
+if not args.genes and not args.plan:
+    error('genes to report (--genes) or a plan size (--plan) is required', 1)
+if args.min_genes < 1:
+    error('--min-genes must be at least 1', 1)
+if not os.path.exists(args.matrix):
+    error('presence matrix '+args.matrix+' not found; run allgenesingb.py first', 1)
+
+
+# Set input and output files
+# ============================================================
+
+out_report = sys.stdout
+if args.output != 'stdout':
+    out_report = open(args.output, 'w')
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.matrix))
+
+
+# Set variables
+# ============================================================
+
+group_dict = {}
+gene_bits_dict = {}
+chosen_list = []
+
+
+# Function to count the set bits of a bitset
+# ============================================================
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+# Function to iterate over the indexes of the set bits of a bitset
+# ============================================================
+
+def set_bits(bits):
+    while bits:
+        low_bit = bits & -bits
+        yield low_bit.bit_length() - 1
+        bits ^= low_bit
+
+
+# Function to add a gene to the coverage levels, where level k holds the species with at least k of the genes
+# ============================================================
+
+def add_gene(levels, bits):
+    return [levels[0]] + [levels[k] | (levels[k-1] & bits) for k in range(1, len(levels))]
+
+
+# Function to return the gene of a name given on the command line
+# ============================================================
+
+def find_gene(name):
+    name = name.strip().upper()
+    gene_name = group_dict.get(name, name)
+    if gene_name not in gene_bits_dict:
+        error('gene '+name+' not found in '+args.matrix, 1)
+    return gene_name
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Read the presence matrix and group names into genes by synonym cluster, then by key
+# ============================================================
+
+run_metrics.phase('read')
+gene_names, species_bits_dict = gbtools.read_matrix(args.matrix)
+if args.clusters:
+    for line in open(args.clusters, 'r'):
+        if not line.startswith('\t'):
+            names = line.rstrip('\n').split('\t')
+            for name in names:
+                group_dict[name] = names[0]
+if args.key:
+    gene_dict, gene_order = gbtools.read_keys(args.key)
+    group_dict.update(gene_dict)
+
+
+# Transpose the species bitsets into one bitset of species per gene
+# ============================================================
+
+species_list = sorted(species_bits_dict)
+column_list = [group_dict.get(name, name) for name in gene_names]
+for species_index, species_name in enumerate(run_metrics.counted(species_list)):
+    species_bit = 1 << species_index
+    for column in set_bits(species_bits_dict[species_name]):
+        gene_bits_dict[column_list[column]] = gene_bits_dict.get(column_list[column], 0) | species_bit
+
+
+# Add the given genes in order, then greedily add the gene that covers the most species with at least min genes,
+# breaking ties by the species gaining a gene below min genes, the species with the gene, and the gene name
+# ============================================================
+
+run_metrics.phase('plan')
+levels = [(1 << len(species_list)) - 1] + [0] * args.min_genes
+if args.genes:
+    for gene_name in args.genes.split(','):
+        gene_name = find_gene(gene_name)
+        if gene_name not in chosen_list:
+            chosen_list.append(gene_name)
+            levels = add_gene(levels, gene_bits_dict[gene_name])
+exclude_set = set([find_gene(x) for x in args.exclude.split(',')]) if args.exclude else set()
+candidate_list = sorted([x for x in gene_bits_dict if x not in exclude_set], key=lambda x: (-popcount(gene_bits_dict[x]), x))
+while args.plan and len(chosen_list) < args.plan:
+    best_score = None
+    best_gene = None
+    for gene_name in candidate_list:
+        if gene_name not in chosen_list:
+            new_levels = add_gene(levels, gene_bits_dict[gene_name])
+            score = (popcount(new_levels[-1]), sum([popcount(x) for x in new_levels[1:]]))
+            if best_score is None or score > best_score:
+                best_score = score
+                best_gene = gene_name
+    if best_gene is None:
+        break
+    chosen_list.append(best_gene)
+    levels = add_gene(levels, gene_bits_dict[best_gene])
+
+
+# Write out the species with each gene and the species covered after adding each gene, and the species with at least
+# k of the genes
+# ============================================================
+
+run_metrics.phase('write')
+species_count = len(species_list)
+out_report.write("A total of "+str(species_count)+" species were counted; species are covered by at least "+str(args.min_genes)+" of the genes.\n")
+out_report.write("Gene\tSpecies\tPercent\tCovered\tPercent\n")
+levels = [(1 << species_count) - 1] + [0] * args.min_genes
+for gene_name in chosen_list:
+    levels = add_gene(levels, gene_bits_dict[gene_name])
+    with_count = popcount(gene_bits_dict[gene_name])
+    covered_count = popcount(levels[-1])
+    out_report.write(gene_name+'\t'+str(with_count)+'\t'+str(int(with_count*100/max(species_count, 1)))+'\t'
+                     +str(covered_count)+'\t'+str(int(covered_count*100/max(species_count, 1)))+'\n')
+gene_count_list = [0] * species_count
+for gene_name in chosen_list:
+    for species_index in set_bits(gene_bits_dict[gene_name]):
+        gene_count_list[species_index] += 1
+out_report.write("Genes\tSpecies\tPercent\n")
+for gene_total in range(len(chosen_list), 0, -1):
+    at_least_count = len([x for x in gene_count_list if x >= gene_total])
+    out_report.write('>='+str(gene_total)+'\t'+str(at_least_count)+'\t'+str(int(at_least_count*100/max(species_count, 1)))+'\n')
+if args.table:
+    out_table = open(args.table, 'w')
+    for species_index, species_name in enumerate(species_list):
+        out_table.write(species_name+'\t'+str(gene_count_list[species_index])+'\t'
+                        +','.join([x for x in chosen_list if gene_bits_dict[x] >> species_index & 1])+'\n')
+    out_table.close()
+
+
+# Close output files
+# ============================================================
+
+if args.output != 'stdout':
+    out_report.close()
+run_metrics.close()
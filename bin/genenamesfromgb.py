@@ -29,15 +29,21 @@
 # Import modules
 # ============================================================
 
-import argparse, os, subprocess, sys
-from Bio import SeqIO
+import argparse, os
+import gbtools, metrics
 
 
 # Parse arguments
 # ============================================================
 
-parser = argparse.ArgumentParser(description='This script finds any gene names that are not in the key files, allowing the user to check for potential mistaken gene names in the input and to expand the key files with other gene names.')
+parser = argparse.ArgumentParser(description='This script finds any gene names that are not in the key files, allowing the user to check for potential mistaken gene names in the input and to expand the key files with other gene names. The first occurrence of each gene name in the gb file is cached, so rechecking an edited key does not reparse the gb file until it changes.')
+parser.add_argument("-a", "--accessions", metavar='STR', help="file of accessions to analyze, one per line; records are fetched through the index and the cache is not used [all]", type=str)
+parser.add_argument("-c", "--cache", metavar='STR', help="file name for the cached gene name inventory [input file name.names_cache]", type=str)
+parser.add_argument("-f", "--fast", help="scan only record headers and features, skipping sequences", action='store_true')
+parser.add_argument("-i", "--index", metavar='STR', help="index of the input gb file from indexgb.py, used with --accessions, or with --fast to read all records from the index instead of the gb file [input file name.idx]", type=str)
 parser.add_argument("-o", "--output", metavar='STR', help="output prefix [input file name]", type=str)
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
 parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
 required = parser.add_argument_group('required arguments')
 required.add_argument("gene_key", help="gene names key", type=str)
@@ -48,32 +54,23 @@ args = parser.parse_args()
 # Set input and output files
 # ============================================================
 
-in_gb = open(args.input, 'r')
+accessions = None
+if args.accessions:
+    accessions = gbtools.read_accessions(args.accessions)
 if not args.output:
     args.output = args.input
-out_gene_name = args.output+'.gene.names'
-if os.path.exists(out_gene_name):
-    subprocess.call(['rm', out_gene_name])
+if not args.cache:
+    args.cache = args.input+'.names_cache'
+out_gene_name = open(args.output+'.gene.names', 'w')
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.input))
 
 
 # Set variables
 # ============================================================
 
-list_features = ['gene','CDS','mRNA','rRNA','tRNA']
-gene_names_seen = []
-gene_names = []
-
-
-# Function to check if gene name is in the key file or already seen; if not, then write out id and name
-# ============================================================
-
-def writename(test_id, test_name, outfile_name, list_name, list_name_seen):
-    if test_name not in list_name and test_name not in list_name_seen:
-        outfile = open(outfile_name, 'a')
-        outfile.write(test_id+'\t'+test_name+'\n')
-        outfile.close()
-        list_name_seen.append(test_name)
-    return list_name_seen
+gene_names = set()
+inventory = None
+signature = gbtools.file_signature(args.input)
 
 
 ###############################################################################
@@ -86,22 +83,45 @@ def writename(test_id, test_name, outfile_name, list_name, list_name_seen):
 for line in open(args.gene_key, 'r'):
     if not line.startswith('GB_name'):
         line = line.upper().rstrip()
-        gene_names.append(line)
+        gene_names.add(line)
+
+
+# Read cached inventory of the first accession and feature type for each gene name if the gb file is unchanged
+# ============================================================
+
+run_metrics.phase('cache')
+if accessions is None and os.path.exists(args.cache):
+    in_cache = open(args.cache, 'r')
+    if in_cache.readline().rstrip('\n') == '#'+signature:
+        inventory = [line.rstrip('\n').split('\t') for line in in_cache]
+    in_cache.close()
+
+
+# Otherwise parse input gb file and write out the inventory
+# ============================================================
+
+if inventory is None:
+    run_metrics.phase('inventory')
+    inventory = gbtools.name_inventory(run_metrics.counted(gbtools.parse_entries(args.input, args.index, accessions, args.fast)))
+    if accessions is None:
+        out_cache = open(args.cache, 'w')
+        out_cache.write('#'+signature+'\n')
+        for item in inventory:
+            out_cache.write('\t'.join(item)+'\n')
+        out_cache.close()
 
 
-# Parse input gb file
+# Write out id and name for each gene name not in the key file
 # ============================================================
 
-for record in SeqIO.parse(in_gb, "gb"):
-    for feature in record.features:
-        if feature.type in list_features:
-            if 'gene' in feature.qualifiers:
-                gene_names_seen = writename(record.id, feature.qualifiers['gene'][0].upper(), out_gene_name, gene_names, gene_names_seen)
-            elif 'product' in feature.qualifiers:
-                gene_names_seen = writename(record.id, feature.qualifiers['product'][0].upper(), out_gene_name, gene_names, gene_names_seen)
+run_metrics.phase('write')
+for record_id, name, feature_type in inventory:
+    if name not in gene_names:
+        out_gene_name.write(record_id+'\t'+name+'\n')
 
 
-# Close input and output files
+# Close output files
 # ============================================================
 
-in_gb.close()
+out_gene_name.close()
+run_metrics.close()
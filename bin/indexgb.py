@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os
+import gbtools, metrics
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script builds an index of a gb file recording the byte offset and length of each record along with its species name, sequence length, and annotated features, allowing the other scripts to fetch records by accession through random access instead of parsing the full gb file. The gb file may be plain text, gzip, or BGZF; offsets into BGZF files are virtual offsets.')
+parser.add_argument("-c", "--compress", metavar='STR', help="write the input gb file (or - for stdin) BGZF-compressed to this file name and index the compressed file [none]", type=str)
+parser.add_argument("-o", "--output", metavar='STR', help="output index file name [input file name.idx]", type=str)
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("input", help="input gb file (- for stdin with --compress)", type=str)
+args = parser.parse_args()
+
+
+# Set input and output names
+# ============================================================
+
+if args.compress:
+    gb_file = args.compress
+else:
+    gb_file = args.input
+if not args.output:
+    args.output = gbtools.index_name(gb_file)
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.input) if args.input != '-' else None)
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Compress input gb file
+# ============================================================
+
+if args.compress:
+    run_metrics.phase('compress')
+    gbtools.write_bgzf(args.input, args.compress)
+
+
+# Write out index of gb file
+# ============================================================
+
+run_metrics.phase('index')
+gbtools.write_index(gb_file, args.output, run_metrics.counted(gbtools.scan_records(gb_file, check_n=True)))
+run_metrics.close()
@@ -0,0 +1,158 @@
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import os, socket, time
+
+
+# Set variables
+# ============================================================
+
+queue_states = ['pending', 'running', 'done', 'failed']
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+# A queue is a directory on shared storage with one subdirectory per job state. A job is a file of tab-separated
+# field names and values (a field may be repeated) that moves between the subdirectories by rename, so that only one
+# worker can claim it; results are appended to the job file as it moves to done or failed.
+
+# Function to make the state directories of a queue and return the path of a state
+# ============================================================
+
+def queue_dir(queue, state):
+    path = os.path.join(queue, state)
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+    return path
+
+
+# Function to return an identifier of this process that is unique across nodes
+# ============================================================
+
+def worker_id():
+    return socket.gethostname()+':'+str(os.getpid())
+
+
+# Function to read a job file into a list of fields and values
+# ============================================================
+
+def read_job(job_file):
+    fields = []
+    for line in open(job_file, 'r'):
+        line = line.rstrip('\n').split('\t', 1)
+        if len(line) == 2:
+            fields.append((line[0], line[1]))
+    return fields
+
+
+# Function to return the first value of a field of a job, or a default
+# ============================================================
+
+def job_value(fields, name, default=None):
+    for field, value in fields:
+        if field == name:
+            return value
+    return default
+
+
+# Function to add a job to the pending jobs of a queue; jobs are claimed in order of submission
+# ============================================================
+
+def submit_job(queue, name, fields):
+    job_name = '%.6f' % time.time()+'.'+worker_id().replace(':', '.')+'.'+name+'.job'
+    temp_file = os.path.join(queue_dir(queue, 'pending'), '.'+job_name)
+    out_job = open(temp_file, 'w')
+    for field, value in fields:
+        out_job.write(field+'\t'+str(value)+'\n')
+    out_job.close()
+    os.rename(temp_file, os.path.join(queue_dir(queue, 'pending'), job_name))
+    return job_name
+
+
+# Function to claim the oldest pending job by moving it to running; returns the job name or None if no job is pending
+# ============================================================
+
+def claim_job(queue):
+    for job_name in sorted(os.listdir(queue_dir(queue, 'pending'))):
+        if job_name.startswith('.'):
+            continue
+        try:
+            os.rename(os.path.join(queue_dir(queue, 'pending'), job_name), os.path.join(queue_dir(queue, 'running'), job_name))
+        except OSError:
+            continue
+        out_job = open(os.path.join(queue_dir(queue, 'running'), job_name), 'a')
+        out_job.write('worker\t'+worker_id()+'\n')
+        out_job.close()
+        return job_name
+    return None
+
+
+# Function to append the results of a running job and move it to done or failed
+# ============================================================
+
+def finish_job(queue, job_name, status, fields):
+    job_file = os.path.join(queue_dir(queue, 'running'), job_name)
+    out_job = open(job_file, 'a')
+    for field, value in fields + [('status', status)]:
+        out_job.write(field+'\t'+' '.join(str(value).split())+'\n')
+    out_job.close()
+    os.rename(job_file, os.path.join(queue_dir(queue, status), job_name))
+
+
+# Function to move running jobs not modified for a number of seconds, e.g. of a worker that died, back to pending
+# ============================================================
+
+def requeue_jobs(queue, seconds):
+    requeued = []
+    for job_name in os.listdir(queue_dir(queue, 'running')):
+        job_file = os.path.join(queue_dir(queue, 'running'), job_name)
+        try:
+            if time.time() - os.path.getmtime(job_file) > seconds:
+                os.rename(job_file, os.path.join(queue_dir(queue, 'pending'), job_name))
+                requeued.append(job_name)
+        except OSError:
+            continue
+    return requeued
+
+
+# Function to return the state of a job and its file
+# ============================================================
+
+def job_state(queue, job_name):
+    for state in queue_states:
+        job_file = os.path.join(queue, state, job_name)
+        if os.path.exists(job_file):
+            return state, job_file
+    return None, None
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, sys
+import metrics
+import numpy
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script screens extracted gene sequences for outliers before tblastx. Each sequence is reduced to a bottom-s MinHash sketch of its canonical k-mers, and the share of its sketch found in any other sequence is its containment. Sequences with a containment at or below the threshold are written as tblastx candidates (output.candidates.fa), together with a reference (output.reference.fa) of the candidates, their nearest sequences by shared sketch, and an even sample of the other sequences.')
+parser.add_argument("-k", "--kmer", metavar='INT', help="k-mer length, at most 31 [15]", type=int, default=15)
+parser.add_argument("-l", "--log", metavar='STR', help="output file name for the containment of each sequence [stderr]", type=str, default='stderr')
+parser.add_argument("-n", "--neighbors", metavar='INT', help="nearest sequences added to the reference for each candidate [5]", type=int, default=5)
+parser.add_argument("-o", "--output", metavar='STR', help="output prefix [input file name]", type=str)
+parser.add_argument("-r", "--reference", metavar='INT', help="sequences sampled evenly into the reference [200]", type=int, default=200)
+parser.add_argument("-s", "--sketch", metavar='INT', help="sketch size per sequence [200]", type=int, default=200)
+parser.add_argument("-t", "--threshold", metavar='FLOAT', help="containment at or below which a sequence is a candidate; 1 sends all sequences to tblastx [0.1]", type=float, default=0.1)
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("input", help="input fasta file of extracted sequences", type=str)
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set input and output files
+# ============================================================
+
+if not 0 < args.kmer <= 31:
+    error('k-mer length must be between 1 and 31', 1)
+if not args.output:
+    args.output = args.input
+out_log = sys.stderr
+if args.log != 'stderr':
+    out_log = open(args.log, 'w')
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.input))
+
+
+# Set variables
+# ============================================================
+
+base_code = numpy.full(256, 4, dtype=numpy.uint64)
+for base, code in zip('ACGTacgt', [0, 1, 2, 3, 0, 1, 2, 3]):
+    base_code[ord(base)] = code
+fasta_list = []
+kmer_list = []
+sketch_list = []
+
+
+# Function to return the sorted unique hashes of the canonical k-mers of a sequence, skipping k-mers with
+# ambiguous bases
+# ============================================================
+
+def kmerhashes(seq):
+    codes = base_code[numpy.frombuffer(seq, dtype=numpy.uint8)]
+    num_kmers = len(codes) - args.kmer + 1
+    if num_kmers < 1:
+        return numpy.zeros(0, dtype=numpy.uint64)
+    forward = numpy.zeros(num_kmers, dtype=numpy.uint64)
+    reverse = numpy.zeros(num_kmers, dtype=numpy.uint64)
+    for i in range(args.kmer):
+        window = codes[i:i + num_kmers] & numpy.uint64(3)
+        forward = (forward << numpy.uint64(2)) | window
+        reverse = reverse | ((numpy.uint64(3) - window) << numpy.uint64(2 * i))
+    ambiguous = numpy.concatenate(([0], numpy.cumsum(codes == 4)))
+    kmers = numpy.minimum(forward, reverse)[ambiguous[args.kmer:] == ambiguous[:num_kmers]]
+    kmers = kmers * numpy.uint64(0x9E3779B97F4A7C15)
+    kmers ^= kmers >> numpy.uint64(31)
+    return numpy.unique(kmers)
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Read sequences and sketch their k-mers
+# ============================================================
+
+run_metrics.phase('sketch')
+for line in open(args.input, 'r'):
+    line = line.strip()
+    if line.startswith('>'):
+        fasta_list.append([line[1:], []])
+    elif fasta_list:
+        fasta_list[-1][1].append(line)
+fasta_list = [(x[0], ''.join(x[1])) for x in fasta_list]
+for fasta_header, seq in fasta_list:
+    run_metrics.count(1)
+    kmer_list.append(kmerhashes(seq))
+    sketch_list.append(kmer_list[-1][:args.sketch])
+
+
+# Find the containment of each sketch in the k-mers of the other sequences
+# ============================================================
+
+run_metrics.phase('containment')
+if kmer_list:
+    all_kmers, kmer_counts = numpy.unique(numpy.concatenate(kmer_list), return_counts=True)
+containment = numpy.zeros(len(fasta_list))
+for i, sketch in enumerate(sketch_list):
+    if len(sketch):
+        containment[i] = (kmer_counts[numpy.searchsorted(all_kmers, sketch)] > 1).mean()
+candidates = numpy.flatnonzero(containment <= args.threshold)
+for i, (fasta_header, seq) in enumerate(fasta_list):
+    out_log.write(fasta_header+'\t'+('%.3f' % containment[i])+'\t'+('candidate' if containment[i] <= args.threshold else 'pass')+'\n')
+
+
+# Set the reference to the candidates, their nearest sequences by shared sketch, and an even sample of the rest;
+# the sequences sharing each candidate k-mer are found through an inverted index of (k-mer, sequence) pairs sorted by
+# k-mer, so memory grows with the shared k-mers instead of with sequences times candidate k-mers
+# ============================================================
+
+run_metrics.phase('reference')
+reference = set(candidates)
+if len(candidates) and len(candidates) < len(fasta_list):
+    candidate_kmers = numpy.unique(numpy.concatenate([sketch_list[i] for i in candidates]))
+    pair_kmers = numpy.concatenate(kmer_list)
+    pair_seqs = numpy.repeat(numpy.arange(len(kmer_list)), [len(x) for x in kmer_list])
+    pair_index = numpy.searchsorted(candidate_kmers, pair_kmers)
+    found = candidate_kmers[numpy.minimum(pair_index, len(candidate_kmers) - 1)] == pair_kmers
+    pair_index = pair_index[found]
+    pair_order = numpy.argsort(pair_index, kind='mergesort')
+    pair_seqs = pair_seqs[found][pair_order]
+    kmer_starts = numpy.searchsorted(pair_index[pair_order], numpy.arange(len(candidate_kmers) + 1))
+    del pair_kmers, pair_index, found, pair_order
+    for i in candidates:
+        sketch_index = numpy.searchsorted(candidate_kmers, sketch_list[i])
+        shared_count = numpy.bincount(numpy.concatenate([pair_seqs[:0]] + [pair_seqs[kmer_starts[x]:kmer_starts[x + 1]] for x in sketch_index]),
+                                      minlength=len(fasta_list))
+        shared_count[i] = -1
+        reference.update([x for x in numpy.argsort(-shared_count, kind='mergesort')[:args.neighbors] if shared_count[x] > 0])
+    others = [x for x in range(len(fasta_list)) if x not in reference]
+    if others:
+        reference.update([others[x] for x in numpy.linspace(0, len(others) - 1, min(args.reference, len(others))).astype(int)])
+
+
+# Write out candidates and reference in input order
+# ============================================================
+
+run_metrics.phase('write')
+out_candidates = open(args.output+'.candidates.fa', 'w')
+out_reference = open(args.output+'.reference.fa', 'w')
+for i, (fasta_header, seq) in enumerate(fasta_list):
+    if containment[i] <= args.threshold:
+        out_candidates.write('>'+fasta_header+'\n'+seq+'\n')
+    if i in reference:
+        out_reference.write('>'+fasta_header+'\n'+seq+'\n')
+out_candidates.close()
+out_reference.close()
+
+
+# Close output files
+# ============================================================
+
+if args.log != 'stderr':
+    out_log.close()
+run_metrics.close()
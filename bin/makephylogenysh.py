@@ -29,19 +29,26 @@
 # Import modules
 # ============================================================
 
-import argparse, os, subprocess, sys
+import argparse, hashlib, os, subprocess, sys
+import metrics
 
 
 # Parse arguments
 # ============================================================
 
 parser = argparse.ArgumentParser(description='This script creates shell scripts for downloading and analyzing a GenBank record, tblastx confirmation, MAFFT alignment, gBlocks filtering, and RAxML tree creation and bootstrap.', epilog='It is highly recommended that absolute paths be passed via the path flags.')
+parser.add_argument("-a", "--realign", metavar='FLOAT', help="share of new, changed, or removed sequences above which part4 realigns a gene from scratch instead of adding them to the existing alignment [0.25]", type=str, default='0.25')
+parser.add_argument("-b", "--budget", metavar='FLOAT', help="time budget in minutes for MAFFT, used to choose the alignment strategy [none]", type=str)
 parser.add_argument("-e", "--esearch", metavar='STR', help="path for esearch [esearch]", type=str, default='esearch')
 parser.add_argument("-g", "--gblocks", metavar='STR', help="path for Gblocks [Gblocks]", type=str, default='Gblocks')
 parser.add_argument("-m", "--mafft", metavar='STR', help="path for MAFFT [mafft]", type=str, default='mafft')
+parser.add_argument("-q", "--queue", metavar='STR', help="queue directory of gbworker.py workers holding prep/NCBI_full.gb; part2 and the extraction in part3 are submitted to the queue instead of run as new processes [none]", type=str)
 parser.add_argument("-r", "--raxml", metavar='STR', help="path for RAxML [raxmlHPC-HYBRID-SSE3]", type=str, default='raxmlHPC-HYBRID-SSE3')
+parser.add_argument("-s", "--screen", metavar='FLOAT', help="k-mer containment at or below which a sequence is checked with tblastx; 1 checks all sequences [0.1]", type=str, default='0.1')
 parser.add_argument("-t", "--tblastx", metavar='STR', help="path for tblastx [tblastx]", type=str, default='tblastx')
-parser.add_argument("-u", "--threads", metavar='INT', help="threads for tblastx, MAFFT, and RAxML [10]", type=str, default='10')
+parser.add_argument("-u", "--threads", metavar='INT', help="threads for tblastx, MAFFT, and RAxML; the THREADS environment variable set by rungenes.py takes precedence [10]", type=str, default='10')
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
 parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
 parser.add_argument("-w", "--workdir", metavar='STR', help="path for working directory [pwd]", type=str, default=os.getcwd())
 required = parser.add_argument_group('required arguments')
@@ -96,6 +103,20 @@ def check_exe(function):
         error(function+' not found in specified location or not executable', 127)
 
 
+# Function to wrap shell commands in a stage that is skipped by runstage.py if its parameters and input digests are
+# unchanged; inputs may be quoted globs
+# ============================================================
+
+def stage(manifest, name, inputs, outputs, commands):
+    stage_args = ' --params '+hashlib.sha1(commands).hexdigest()
+    stage_args += ''.join([' --input "'+x+'"' for x in inputs])+''.join([' --output "'+x+'"' for x in outputs])
+    stage_args += ' '+manifest+' "'+name+'"'
+    return ('if ! '+scriptsdir+'runstage.py'+stage_args+'; then\n'
+            +commands
+            +scriptsdir+'runstage.py --record'+stage_args+'\n'
+            +'fi\n')
+
+
 # Set variables
 # ============================================================
 
@@ -104,12 +125,22 @@ workdir = os.path.join(os.path.abspath(args.workdir),'')
 prepdir = os.path.join(workdir,'prep','')
 genedir = os.path.join(workdir,args.genename,'')
 mafftdir = os.path.join(workdir,'mafft','')
+genemetrics = os.path.join(genedir,'metrics','')
+mafftmetrics = os.path.join(mafftdir,'metrics','')
+genemanifest = genedir+'stages.manifest'
+mafftmanifest = mafftdir+'stages.manifest'
+gbfile = prepdir+'NCBI_full.gb'
+if os.path.exists(prepdir+'NCBI_full.gb.gz'):
+    gbfile = prepdir+'NCBI_full.gb.gz'
+if args.queue:
+    args.queue = os.path.abspath(args.queue)
+run_metrics = metrics.Metrics(args.metrics, args.profile)
 
 
 # Make directories
 # ============================================================
 
-subprocess.check_call(['mkdir', '-p', genedir])
+subprocess.check_call(['mkdir', '-p', genemetrics])
 
 
 # Check that directories exist
@@ -130,11 +161,18 @@ gblocks = check_exe_return(args.gblocks)
 mafft = check_exe_return(args.mafft)
 raxml = check_exe_return(args.raxml)
 check_exe(scriptsdir+'allgenesingb.py')
-check_exe(scriptsdir+'AfterPhylo.pl')
-check_exe(scriptsdir+'BeforePhylo.pl')
+check_exe(scriptsdir+'blastcheck.py')
 check_exe(scriptsdir+'genenamesfromgb.py')
 check_exe(scriptsdir+'extractgb.py')
+check_exe(scriptsdir+'gbworker.py')
+check_exe(scriptsdir+'indexgb.py')
+check_exe(scriptsdir+'kmerscreen.py')
+check_exe(scriptsdir+'phyconcat.py')
 check_exe(scriptsdir+'phyfilter.py')
+check_exe(scriptsdir+'phytree.py')
+check_exe(scriptsdir+'runstage.py')
+check_exe(scriptsdir+'submitjob.py')
+check_exe(scriptsdir+'updatealign.py')
 tblastx = check_exe_return(args.tblastx)
 makeblastdb = check_exe_return(os.path.dirname('tblastx')+'makeblastdb')
 
@@ -142,6 +180,7 @@ makeblastdb = check_exe_return(os.path.dirname('tblastx')+'makeblastdb')
 # Set output names
 # ============================================================
 
+run_metrics.phase('scripts')
 out_1_sh = open(genedir+args.genename+'.part1.sh', 'w')
 out_2_sh = open(genedir+args.genename+'.part2.sh', 'w')
 out_3_sh = open(genedir+args.genename+'.part3.sh', 'w')
@@ -162,7 +201,8 @@ out_1_sh.write('#!/bin/bash\n\n'
                +esearch+' -db nucleotide -query \'txid'+args.txid+'[Organism] biomol_genomic[PROP] '
                +args.genename+'[All Fields]\' | '+efetch+' -format gb > '+genedir+'NCBI_query.gb\n\n'
                +'# Create list of genes not in key file\n'
-               +scriptsdir+'genenamesfromgb.py '+genedir+args.genename+'.key '+genedir+'NCBI_query.gb\n'
+               +scriptsdir+'genenamesfromgb.py --fast --metrics '+genemetrics+'genenamesfromgb.part1.json '+genedir+args.genename
+               +'.key '+genedir+'NCBI_query.gb\n'
                +'cut -f2 '+genedir+'NCBI_query.gb.gene.names | sort | uniq >'+genedir
                +'NCBI_query.gb.uniq.names\n')
 
@@ -170,10 +210,16 @@ out_1_sh.write('#!/bin/bash\n\n'
 # Write output 2: recheck key file
 # ============================================================
 
+recheck = (scriptsdir+'genenamesfromgb.py --fast --metrics '+genemetrics+'genenamesfromgb.part2.json '+genedir+args.genename
+           +'.key '+genedir+'NCBI_query.gb\n')
+if args.queue:
+    recheck = (scriptsdir+'submitjob.py --wait --job-metrics '+genemetrics+'genenamesfromgb.part2.json --key '+genedir+args.genename
+               +'.key --input '+genedir+'NCBI_query.gb '+args.queue+' names >/dev/null\n')
+
 out_2_sh.write('#!/bin/bash\n\n'
                +'set -e\n\n'
                +'# Recheck list of genes not in key file\n'
-               +scriptsdir+'genenamesfromgb.py '+genedir+args.genename+'.key '+genedir+'NCBI_query.gb\n'
+               +recheck
                +'cut -f2 '+genedir+'NCBI_query.gb.gene.names | sort | uniq >'+genedir
                +'NCBI_query.gb.uniq.names\n')
 
@@ -182,26 +228,36 @@ out_2_sh.write('#!/bin/bash\n\n'
 # ============================================================
 
 extractdir = os.path.join(genedir,'extract','')
+extractfa = extractdir+'sequence.'+args.genename+'.fa'
+extract = (scriptsdir+'extractgb.py --silent --metrics '+genemetrics+'extractgb.json --index '+gbfile
+           +'.idx --log '+genedir+'log.extractgb --table '+genedir+'extract.table --output '+extractdir
+           +'sequence '+genedir+args.genename+'.key '+gbfile+'\n')
+if args.queue:
+    extract = (scriptsdir+'submitjob.py --wait --silent --job-metrics '+genemetrics+'extractgb.json --input '+gbfile+' --log '
+               +genedir+'log.extractgb --table '+genedir+'extract.table --output '+extractdir+'sequence --key '+genedir
+               +args.genename+'.key '+args.queue+' extract >/dev/null\n')
 
 out_3_sh.write('#!/bin/bash\n\n'
                +'set -e\n\n'
                +'# Extract gene annotations from GenBank records\n'
-               +'mkdir -p '+extractdir+'\n'
-               +scriptsdir+'extractgb.py --silent --log '+genedir+'log.extractgb --output '+extractdir
-               +'sequence '+genedir+args.genename+'.key '+prepdir+'NCBI_full.gb\n\n'
-               +'# Merge sequences for all species\n'
-               +'cat '+extractdir+'sequence*.'+args.genename+'.fa > '+extractdir+args.genename+'.cat.fa\n\n'
-               +'# Identify possible incorrect sequences with blast\n'
-               +makeblastdb+' -dbtype nucl -in '+extractdir+args.genename+'.cat.fa &>'+genedir+'blast.log\n'
-               +tblastx+' -query '+extractdir+args.genename+'.cat.fa -db '+extractdir+args.genename+'.cat.fa'
-               +' -evalue '+'0.00001 -outfmt 6 -max_target_seqs 30 -num_threads '+args.threads+' 1>'+genedir
-               +'blast.out 2>>'+genedir+'blast.log\n'
-               +'printf \'\' >'+genedir+'blast.incorrect \n'
-               +'awk \'{if($1 != $2) {print $1}}\' '+genedir+'blast.out | sort | uniq >'+genedir+'temp\n'
-               +'grep \'^>\' '+extractdir+args.genename+'.cat.fa | cut -c2- >>'+genedir+'temp\n'
-               +'sort '+genedir+'temp | uniq -u | while read z; do grep ${z} '+genedir+'log.extractgb >>'
-               +genedir+'blast.incorrect; done\n'
-               +'rm '+genedir+'temp\n')
+               +stage(genemanifest, 'extract', [genedir+args.genename+'.key', gbfile+'.idx'],
+                      [extractfa, extractfa+'.fai', genedir+'log.extractgb', genedir+'extract.table'],
+                      'mkdir -p '+extractdir+'\n'+extract)
+               +'\n# Screen sequences by shared k-mers and identify possible incorrect sequences among the candidates with blast\n'
+               +stage(genemanifest, 'blast', [extractfa, genedir+'extract.table'],
+                      [genedir+'blast.out', genedir+'blast.incorrect', genedir+'blast.summary'],
+                      scriptsdir+'kmerscreen.py --threshold '+args.screen+' --metrics '+genemetrics+'kmerscreen.json --log '
+                      +genedir+'log.kmerscreen --output '+genedir+'screen '+extractfa+'\n'
+                      +'printf \'\' >'+genedir+'blast.out\n'
+                      +'if [ -s '+genedir+'screen.candidates.fa ]; then\n'
+                      +makeblastdb+' -dbtype nucl -in '+genedir+'screen.reference.fa &>'+genedir+'blast.log\n'
+                      +tblastx+' -query '+genedir+'screen.candidates.fa -db '+genedir+'screen.reference.fa'
+                      +' -evalue '+'0.00001 -outfmt 6 -max_target_seqs 30 -num_threads ${THREADS:-'+args.threads+'} 1>'+genedir
+                      +'blast.out 2>>'+genedir+'blast.log\n'
+                      +'fi\n'
+                      +scriptsdir+'blastcheck.py --metrics '+genemetrics+'blastcheck.json --query '+genedir
+                      +'screen.candidates.fa --summary '+genedir+'blast.summary --output '+genedir+'blast.incorrect '
+                      +genedir+'extract.table '+genedir+'blast.out\n'))
 
 
 # Write output 4: make alignment
@@ -209,42 +265,52 @@ out_3_sh.write('#!/bin/bash\n\n'
 
 out_4_sh.write('#!/bin/bash\n\n'
                +'set -e\n\n'
-               +'# Re-merge sequences for all species\n'
-               +'cat '+extractdir+'sequence*.'+args.genename+'.fa > '+extractdir+args.genename+'.cat.fa\n\n'
-               +'# Run mafft on merged gene file\n'
-               +mafft+' --maxiterate 1000000 --genafpair --thread '+args.threads+' '+extractdir+args.genename
-               +'.cat.fa >'+mafftdir+args.genename+'.cat.mafft.fa 2>'+genedir+'log.mafft\n')
+               +'# Run mafft on extracted gene file, adding new or changed sequences to an existing alignment\n'
+               +stage(genemanifest, 'mafft', [extractfa], [mafftdir+args.genename+'.cat.mafft.fa'],
+                      scriptsdir+'updatealign.py --metrics '+genemetrics+'updatealign.json --mafft '+mafft
+                      +(' --budget '+args.budget if args.budget else '')+' --log '+mafftdir+'log.strategy --realign '+args.realign+' --threads ${THREADS:-'
+                      +args.threads+'} '+extractfa+' '+mafftdir+args.genename+'.cat.mafft.fa 2>'+genedir+'log.mafft\n'))
 
 
 # Make mafft directory and write analysis script
 # ============================================================
 
 if not os.path.isdir(mafftdir):
-    subprocess.check_call(['mkdir', mafftdir])
+    subprocess.check_call(['mkdir', '-p', mafftmetrics])
     check_dir(mafftdir)
     out_5_sh = open(mafftdir+'analysis.sh', 'w')
     out_5_sh.write('#!/bin/bash\n\n'
                    +'set -e\n\n'
-                   +'# Concatenate mafft alignments, run Gblocks, and change names\n'
-                   +'cat '+os.path.join(workdir,'*','')+'log.extractgb | grep -v \'Extracting a total of\' |'
-                   +' cut -f2 | sort | uniq | awk \'{print $0 "\\t" "taxon" NR}\' >'+mafftdir
-                   +'translate.dict\n'
-                   +scriptsdir+'BeforePhylo.pl -type=dna -conc=raxml -sort -Gblocks='+gblocks
-                   +' -trim -translate='+mafftdir+'translate.dict -output=phylip '+mafftdir+'*.fa >'
-                   +mafftdir+'log.BeforePhylo\n\n'
-                   +'# Remove individuals without any data and duplicate individuals\n'
-                   +scriptsdir+'phyfilter.py -l '+mafftdir+'output.filter.log -o '+mafftdir
-                   +'output.filter.phy '+mafftdir+'output.phy\n\n'
-                   +'# Run RAxML\n'
-                   +raxml+' -f a -T '+args.threads+' -m GTRGAMMA -n RAxML -# autoMRE_IGN -x $RANDOM -p '
-                   +'$RANDOM -q '+mafftdir+'output_partitions.txt -s '+mafftdir+'output.filter.phy\n\n'
-                   +'# Revert names and analyze tree\n'
-                   +'awk \'{print $2 "\\t" $1}\' '+mafftdir+'translate.dict >'+mafftdir+'replace.dict\n'
-                   +scriptsdir+'AfterPhylo.pl -format=newick -replace -annotate='+mafftdir+'replace.dict '
-                   +mafftdir+'RAxML_bipartitions.RAxML >'+mafftdir+'log.AfterPhylo\n'
-                   +scriptsdir+'AfterPhylo.pl -format=newick -average '+mafftdir+'RAxML_bipartitions.RAxML '
-                   +'>>'+mafftdir+'log.AfterPhylo\n'
-                   +'ln -s '+mafftdir+'RAxML_bipartitions.out.RAxML '+workdir+'final.tree\n')
+                   +'# Run Gblocks on each mafft alignment\n'
+                   +'for z in '+mafftdir+'*.cat.mafft.fa; do\n'
+                   +stage(mafftmanifest, 'gblocks.$(basename ${z})', ['${z}'], ['${z}-gb'],
+                          gblocks+' ${z} -t=d -b5=h -p=n >>'+mafftdir+'log.Gblocks || test -s ${z}-gb\n')
+                   +'done\n\n'
+                   +'# Concatenate alignments and change names\n'
+                   +stage(mafftmanifest, 'concatenate', [mafftdir+'*.cat.mafft.fa-gb', os.path.join(workdir,'*','')+'log.extractgb'],
+                          [mafftdir+'output.phy', mafftdir+'output_partitions.txt', mafftdir+'translate.dict'],
+                          scriptsdir+'phyconcat.py --metrics '+mafftmetrics+'phyconcat.json --extractlogs \''
+                          +os.path.join(workdir,'*','')+'log.extractgb\' --dict '+mafftdir+'translate.dict --log '+mafftdir
+                          +'log.phyconcat --output '+mafftdir+'output '+mafftdir+'*.cat.mafft.fa-gb\n')
+                   +'\n# Remove individuals without any data and duplicate individuals\n'
+                   +stage(mafftmanifest, 'phyfilter', [mafftdir+'output.phy'], [mafftdir+'output.filter.phy'],
+                          scriptsdir+'phyfilter.py --metrics '+mafftmetrics+'phyfilter.json -l '+mafftdir+'output.filter.log -o '
+                          +mafftdir+'output.filter.phy '+mafftdir+'output.phy\n')
+                   +'\n# Run RAxML\n'
+                   +stage(mafftmanifest, 'raxml', [mafftdir+'output.filter.phy', mafftdir+'output_partitions.txt'],
+                          [mafftdir+'RAxML_bipartitions.RAxML'],
+                          'rm -f '+mafftdir+'RAxML_*.RAxML\n'
+                          +raxml+' -f a -T ${THREADS:-'+args.threads+'} -m GTRGAMMA -n RAxML -# autoMRE_IGN -x $RANDOM -p '
+                          +'$RANDOM -w '+mafftdir+' -q '+mafftdir+'output_partitions.txt -s '+mafftdir+'output.filter.phy\n')
+                   +'\n# Revert names and analyze tree\n'
+                   +stage(mafftmanifest, 'phytree', [mafftdir+'RAxML_bipartitions.RAxML', mafftdir+'translate.dict'],
+                          [mafftdir+'RAxML_bipartitions.out.RAxML', mafftdir+'RAxML_bipartitions.out.nex'],
+                          'awk \'{print $2 "\\t" $1}\' '+mafftdir+'translate.dict >'+mafftdir+'replace.dict\n'
+                          +scriptsdir+'phytree.py --metrics '+mafftmetrics+'phytree.json --dict '+mafftdir+'replace.dict --log '
+                          +mafftdir+'log.phytree --nexus '+mafftdir+'RAxML_bipartitions.out.nex --output '+mafftdir
+                          +'RAxML_bipartitions.out.RAxML '+mafftdir+'RAxML_bipartitions.RAxML\n'
+                          +'ln -sf '+mafftdir+'RAxML_bipartitions.out.RAxML '+workdir+'final.tree\n'
+                          +'ln -sf '+mafftdir+'RAxML_bipartitions.out.nex '+workdir+'final.nex\n'))
     out_5_sh.close()
     subprocess.check_call(['chmod', 'u+x', mafftdir+'analysis.sh'])
 
@@ -272,4 +338,6 @@ subprocess.check_call(['chmod', 'u+x', genedir+args.genename+'.part1.sh'])
 subprocess.check_call(['chmod', 'u+x', genedir+args.genename+'.part2.sh'])
 subprocess.check_call(['chmod', 'u+x', genedir+args.genename+'.part3.sh'])
 subprocess.check_call(['chmod', 'u+x', genedir+args.genename+'.part4.sh'])
+run_metrics.phase('part1')
 subprocess.check_call([genedir+args.genename+'.part1.sh'])
+run_metrics.close()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, shutil, sys, tempfile
+import gbtools, metrics
+from Bio import bgzf
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script merges a batch of new GenBank records (e.g. a monthly efetch of recently modified records) into an existing gb file and its index from indexgb.py by accession.version. New accessions and newer versions are appended to the gb file and replace superseded versions in the index; unchanged and older versions are skipped. The species and gene names whose selection the batch could change are written to a report (species, gene, accession, new/updated).', epilog='Superseded records remain in the gb file, where they are ignored by all index-based readers, until the gb file is rewritten with --compact.')
+parser.add_argument("-c", "--compact", help="rewrite the gb file with only the indexed records after merging", action='store_true')
+parser.add_argument("-i", "--index", metavar='STR', help="index of the input gb file from indexgb.py [input file name.idx]", type=str)
+parser.add_argument("-k", "--key", metavar='STR', help="gene names key or directory of .key files used to report key names instead of annotated names; may be given multiple times [none]", type=str, action='append', default=[])
+parser.add_argument("-r", "--report", metavar='STR', help="output file name for species and genes changed by the batch [input file name.delta]", type=str)
+parser.add_argument("-s", "--silent", help="run script in silent mode", action='store_true')
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("input", help="input plain or BGZF gb file to update", type=str)
+required.add_argument("batch", help="gb file of new records (- for stdin)", type=str)
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set input and output names
+# ============================================================
+
+if not args.index:
+    args.index = gbtools.index_name(args.input)
+if not args.report:
+    args.report = args.input+'.delta'
+if not os.path.exists(args.index):
+    error('index '+args.index+' not found; run indexgb.py first', 1)
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.batch) if args.batch != '-' else None)
+
+
+# Set variables
+# ============================================================
+
+live_id_dict = {}
+changed_list = []
+old_entry_dict = {}
+skipped_count = 0
+
+
+# Function to return the species and gene names of an index entry
+# ============================================================
+
+def speciesgenes(entry):
+    names = set()
+    for feature in entry.features:
+        if gene_dict:
+            name = gbtools.match_feature(gene_dict, feature.type, feature.gene, feature.product)
+        elif feature.type in gbtools.list_features:
+            name = (feature.gene or feature.product or '').upper()
+        else:
+            name = None
+        if name:
+            names.add(name)
+    return '_'.join(entry.organism.split(' ')[0:2]), names
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Set key names
+# ============================================================
+
+gene_dict, gene_order = gbtools.read_keys(args.key, None if args.silent else sys.stderr)
+
+
+# Read existing index
+# ============================================================
+
+run_metrics.phase('read index')
+index_entries = list(gbtools.read_index(args.index))
+for entry in index_entries:
+    accession, version = gbtools.split_version(entry.id)
+    if accession not in live_id_dict or version > gbtools.split_version(live_id_dict[accession])[1]:
+        live_id_dict[accession] = entry.id
+        old_entry_dict[accession] = entry
+
+
+# Spool stdin to a temporary file so that the batch can be scanned with its raw records
+# ============================================================
+
+batch_file = args.batch
+if args.batch == '-':
+    temp_batch = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(args.input)), delete=False)
+    shutil.copyfileobj(sys.stdin, temp_batch, 1048576)
+    temp_batch.close()
+    batch_file = temp_batch.name
+
+
+# Append new accessions and newer versions to the gb file
+# ============================================================
+
+run_metrics.phase('append')
+out_gb, append_offset = gbtools.append_gb(args.input)
+for entry, (offset, length, raw) in zip(run_metrics.counted(gbtools.scan_records(batch_file)), gbtools.raw_records(batch_file)):
+    accession, version = gbtools.split_version(entry.id)
+    if accession in live_id_dict and version <= gbtools.split_version(live_id_dict[accession])[1]:
+        skipped_count += 1
+        continue
+    changed_list.append((accession, 'updated' if accession in old_entry_dict else 'new'))
+    live_id_dict[accession] = entry.id
+    out_gb.write(raw)
+out_gb.close()
+if args.batch == '-':
+    os.remove(batch_file)
+
+
+# Write out the index with superseded versions replaced by the appended records
+# ============================================================
+
+run_metrics.phase('index')
+new_entry_dict = {}
+for entry in gbtools.scan_records(args.input, append_offset, check_n=True):
+    if live_id_dict[gbtools.split_version(entry.id)[0]] == entry.id:
+        new_entry_dict[gbtools.split_version(entry.id)[0]] = entry
+index_entries = [x for x in index_entries if live_id_dict[gbtools.split_version(x.id)[0]] == x.id]
+index_entries.extend(sorted(new_entry_dict.values(), key=lambda x: x.offset))
+gbtools.write_index(args.input, args.index+'.tmp', index_entries)
+os.rename(args.index+'.tmp', args.index)
+
+
+# Write out the species and gene names of the superseded and new versions of each changed accession
+# ============================================================
+
+run_metrics.phase('report')
+species_genes_set = set()
+out_report = open(args.report, 'w')
+for accession, status in sorted(set(changed_list)):
+    rows = set()
+    for entry in [old_entry_dict.get(accession), new_entry_dict.get(accession)]:
+        if entry is not None:
+            species_name, names = speciesgenes(entry)
+            rows.update([(species_name, x) for x in names])
+    for species_name, gene_name in sorted(rows):
+        out_report.write(species_name+'\t'+gene_name+'\t'+live_id_dict[accession]+'\t'+status+'\n')
+    species_genes_set.update(rows)
+out_report.close()
+if not args.silent:
+    sys.stderr.write("Merged "+str(len([x for x in new_entry_dict if x not in old_entry_dict]))+" new and "
+                     +str(len([x for x in new_entry_dict if x in old_entry_dict]))+" updated records; skipped "
+                     +str(skipped_count)+" unchanged records.\n")
+    sys.stderr.write("Genes with changed selections: "+(', '.join(sorted(set([x[1] for x in species_genes_set]))) or 'none')+".\n")
+
+
+# Rewrite the gb file with only the indexed records and reindex it
+# ============================================================
+
+if args.compact:
+    run_metrics.phase('compact')
+    live_offsets = set([x.offset for x in index_entries])
+    if gbtools.gb_format(args.input) == 'bgzf':
+        out_gb = bgzf.BgzfWriter(args.input+'.tmp', 'wb')
+    else:
+        out_gb = open(args.input+'.tmp', 'wb')
+    for offset, length, raw in gbtools.raw_records(args.input):
+        if offset in live_offsets:
+            out_gb.write(raw)
+    out_gb.close()
+    os.rename(args.input+'.tmp', args.input)
+    gbtools.write_index(args.input, args.index+'.tmp')
+    os.rename(args.index+'.tmp', args.index)
+run_metrics.close()
@@ -0,0 +1,192 @@
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import atexit, json, os, resource, sys, time
+
+
+# Set variables
+# ============================================================
+
+progress_interval = 10.0
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+# Function to return the bytes read by this process so far, or None if /proc is not available
+# ============================================================
+
+def bytes_read():
+    try:
+        for line in open('/proc/self/io', 'r'):
+            if line.startswith('rchar:'):
+                return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+
+# Function to return the user and system CPU seconds of this process and of its finished children
+# ============================================================
+
+def cpu_seconds():
+    times = os.times()
+    return times[0] + times[1], times[2] + times[3]
+
+
+###############################################################################
+# Classes
+###############################################################################
+
+# Class to collect run metrics in sequential phases and write them as JSON; without a file name all calls do nothing
+# ============================================================
+
+class Metrics(object):
+
+    def __init__(self, metrics_file=None, profile=False, total_bytes=None):
+        self.metrics_file = metrics_file
+        self.total_bytes = total_bytes
+        self.profiler = None
+        self.closed = False
+        if not metrics_file:
+            return
+        self.start_wall = time.time()
+        self.start_cpu = cpu_seconds()
+        self.start_bytes = bytes_read()
+        self.last_progress = self.start_wall
+        self.data = {'script': os.path.basename(sys.argv[0]), 'argv': sys.argv[1:], 'status': 'running',
+                     'start': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.start_wall)),
+                     'records': 0, 'features': 0, 'phases': [], 'progress': [], 'profile': None}
+        self.current = None
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        atexit.register(self.close, 'exited')
+
+    # Function to end the current phase and start a new one
+    # ============================================================
+
+    def phase(self, name):
+        if not self.metrics_file:
+            return
+        self.endphase()
+        self.current = {'name': name, 'records': 0, 'features': 0, 'wall_start': time.time(),
+                        'cpu_start': cpu_seconds(), 'bytes_start': bytes_read()}
+
+    # Function to end the current phase and store its times and counts
+    # ============================================================
+
+    def endphase(self):
+        if self.current is None:
+            return
+        phase = self.current
+        cpu_end = cpu_seconds()
+        bytes_end = bytes_read()
+        self.data['phases'].append({'name': phase['name'], 'records': phase['records'], 'features': phase['features'],
+                                    'wall_seconds': round(time.time() - phase['wall_start'], 3),
+                                    'cpu_seconds': round(cpu_end[0] - phase['cpu_start'][0], 3),
+                                    'children_cpu_seconds': round(cpu_end[1] - phase['cpu_start'][1], 3),
+                                    'bytes_read': bytes_end - phase['bytes_start'] if bytes_end is not None else None})
+        self.current = None
+
+    # Function to count records and features in the current phase and record progress periodically
+    # ============================================================
+
+    def count(self, records=0, features=0):
+        if not self.metrics_file:
+            return
+        self.data['records'] += records
+        self.data['features'] += features
+        if self.current is not None:
+            self.current['records'] += records
+            self.current['features'] += features
+        now = time.time()
+        if now - self.last_progress >= progress_interval:
+            self.last_progress = now
+            self.progress(now)
+
+    # Function to pass through records or index entries while counting them and their features
+    # ============================================================
+
+    def counted(self, records):
+        for record in records:
+            self.count(1, len(getattr(record, 'features', ())))
+            yield record
+
+    # Function to add a progress entry with the rate and, if the input size is known, the estimated time left
+    # ============================================================
+
+    def progress(self, now):
+        seconds = now - self.start_wall
+        entry = {'seconds': round(seconds, 1), 'phase': self.current['name'] if self.current else None,
+                 'records': self.data['records'], 'records_per_second': round(self.data['records'] / seconds, 1),
+                 'bytes_read': None, 'fraction': None, 'eta_seconds': None}
+        current_bytes = bytes_read()
+        if current_bytes is not None and self.start_bytes is not None:
+            entry['bytes_read'] = current_bytes - self.start_bytes
+            if self.total_bytes and entry['bytes_read']:
+                entry['fraction'] = round(min(float(entry['bytes_read']) / self.total_bytes, 1.0), 4)
+                entry['eta_seconds'] = round(seconds / entry['fraction'] - seconds, 1)
+        self.data['progress'].append(entry)
+        self.write()
+
+    # Function to finish the run and write out the metrics and profile
+    # ============================================================
+
+    def close(self, status='finished'):
+        if not self.metrics_file or self.closed:
+            return
+        self.closed = True
+        self.endphase()
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.metrics_file+'.prof')
+            self.data['profile'] = self.metrics_file+'.prof'
+        cpu_end = cpu_seconds()
+        bytes_end = bytes_read()
+        self.data['status'] = status
+        self.data['wall_seconds'] = round(time.time() - self.start_wall, 3)
+        self.data['cpu_seconds'] = round(cpu_end[0] - self.start_cpu[0], 3)
+        self.data['children_cpu_seconds'] = round(cpu_end[1] - self.start_cpu[1], 3)
+        self.data['bytes_read'] = bytes_end - self.start_bytes if bytes_end is not None and self.start_bytes is not None else None
+        self.data['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.data['children_peak_rss_kb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        self.write()
+
+    # Function to write the metrics atomically so the file can be read while the run continues
+    # ============================================================
+
+    def write(self):
+        out_metrics = open(self.metrics_file+'.tmp', 'w')
+        json.dump(self.data, out_metrics, indent=1, separators=(',', ': '), sort_keys=True)
+        out_metrics.write('\n')
+        out_metrics.close()
+        os.rename(self.metrics_file+'.tmp', self.metrics_file)
@@ -0,0 +1,362 @@
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import itertools, re, sys
+from collections import namedtuple
+
+
+# Set variables
+# ============================================================
+
+Tree = namedtuple('Tree', ['name', 'rooted', 'parent', 'children', 'label', 'length', 'comment'])
+SupportSummary = namedtuple('SupportSummary', ['tips', 'internal', 'count', 'mean', 'median', 'minimum', 'maximum', 'at_least'])
+token_pattern = re.compile(r"\s*(\[[^\]]*\]|'(?:[^']|'')*'|[(),:;=]|[^\s()\[\],:;=']+)")
+quote_characters = set(" \t()[]',:;=")
+support_keys = set(['bootstrap values', 'bootstrap', 'support'])
+block_size = 1048576
+
+
+###############################################################################
+# Functions
+###############################################################################
+
+# Function to split a Newick or NEXUS file into tokens (brackets, punctuation, quoted and unquoted labels, and
+# comments) while reading it in blocks, so that no token is ever split across two blocks
+# ============================================================
+
+def tokenize(in_tree):
+    buffer = ''
+    position = 0
+    end_of_file = False
+    while True:
+        match = token_pattern.match(buffer, position)
+        if (match is None or match.end() == len(buffer)) and not end_of_file:
+            block = in_tree.read(block_size)
+            end_of_file = not block
+            buffer = buffer[position:] + block
+            position = 0
+            continue
+        if match is None:
+            if buffer[position:].strip():
+                raise ValueError('unexpected text in tree: '+buffer[position:position+40].strip())
+            return
+        position = match.end()
+        yield match.group(1)
+
+
+# Function to remove the quotes of a quoted label
+# ============================================================
+
+def unquote(token):
+    if token.startswith("'"):
+        return token[1:-1].replace("''", "'")
+    return token
+
+
+# Function to quote a label if it contains characters with a meaning in Newick
+# ============================================================
+
+def quote(label):
+    if quote_characters.intersection(label):
+        return "'"+label.replace("'", "''")+"'"
+    return label
+
+
+# Function to add a node below a parent (-1 for the root) and return its index
+# ============================================================
+
+def add_node(parent, children, label, length, comment, parent_node):
+    parent.append(parent_node)
+    children.append([])
+    label.append(None)
+    length.append(None)
+    comment.append(None)
+    if parent_node >= 0:
+        children[parent_node].append(len(parent) - 1)
+    return len(parent) - 1
+
+
+# Function to parse one tree from the tokens up to and including its closing semicolon into arrays indexed by node
+# (parent, children, label, branch length, and comment) in pre-order with the root at 0, using an explicit stack of
+# open nodes instead of recursion; tip labels are translated if a translation dict is given
+# ============================================================
+
+def parse_tree(tokens, name=None, translate_dict=None):
+    parent, children, label, length, comment = [], [], [], [], []
+    rooted = None
+    stack = []
+    current = None
+    in_length = False
+    for token in tokens:
+        if token == '(':
+            if current is not None:
+                raise ValueError('missing comma before ( in tree '+str(name))
+            stack.append(add_node(parent, children, label, length, comment, stack[-1] if stack else -1))
+        elif token in (',', ')', ';'):
+            if current is None and stack:
+                add_node(parent, children, label, length, comment, stack[-1])
+            current = None
+            in_length = False
+            if token == ')':
+                if not stack:
+                    raise ValueError('unbalanced ) in tree '+str(name))
+                current = stack.pop()
+            elif token == ';':
+                if stack:
+                    raise ValueError('unbalanced ( in tree '+str(name))
+                if not parent:
+                    raise ValueError('empty tree '+str(name))
+                if translate_dict is not None:
+                    for node in range(len(parent)):
+                        if not children[node] and label[node] in translate_dict:
+                            label[node] = translate_dict[label[node]]
+                return Tree(name, rooted, parent, children, label, length, comment)
+        elif token == ':':
+            if current is None:
+                current = add_node(parent, children, label, length, comment, stack[-1] if stack else -1)
+            in_length = True
+        elif token.startswith('['):
+            if not parent and token.upper() in ('[&R]', '[&U]'):
+                rooted = token.upper() == '[&R]'
+            elif current is not None:
+                comment[current] = token[1:-1] if comment[current] is None else comment[current]+','+token[1:-1].lstrip('&')
+        elif in_length:
+            length[current] = token
+            in_length = False
+        elif current is None:
+            current = add_node(parent, children, label, length, comment, stack[-1] if stack else -1)
+            label[current] = unquote(token)
+        elif children[current] and label[current] is None:
+            label[current] = unquote(token)
+        else:
+            raise ValueError('unexpected label '+token+' in tree '+str(name))
+    if parent:
+        raise ValueError('missing ; at the end of tree '+str(name))
+    return None
+
+
+# Function to skip the tokens of a NEXUS command up to and including its semicolon
+# ============================================================
+
+def skip_command(tokens):
+    for token in tokens:
+        if token == ';':
+            return
+
+
+# Function to iterate over the trees of a Newick file (one or more trees ended by semicolons) or a NEXUS file (the
+# trees blocks, with tip labels translated by their translate commands), reading the file in a single pass
+# ============================================================
+
+def read_trees(tree_file):
+    in_tree = sys.stdin if tree_file == '-' else open(tree_file, 'r')
+    tokens = tokenize(in_tree)
+    first_token = next(tokens, None)
+    if first_token is not None and first_token.upper() == '#NEXUS':
+        block = None
+        translate_dict = None
+        for token in tokens:
+            command = token.lower()
+            if command == 'begin':
+                block = next(tokens, '').lower()
+                translate_dict = None
+                skip_command(tokens)
+            elif command in ('end', 'endblock'):
+                block = None
+                skip_command(tokens)
+            elif block == 'trees' and command == 'translate':
+                translate_dict = {}
+                pair = []
+                for token in tokens:
+                    if token == ';':
+                        break
+                    elif token != ',':
+                        pair.append(unquote(token))
+                    if len(pair) == 2:
+                        translate_dict[pair[0]] = pair[1]
+                        pair = []
+            elif block == 'trees' and command in ('tree', 'utree'):
+                name = unquote(next(tokens, ''))
+                if name == '*':
+                    name = unquote(next(tokens, ''))
+                if next(tokens, None) != '=':
+                    raise ValueError('missing = after tree '+name)
+                tree = parse_tree(tokens, name, translate_dict)
+                if tree is None:
+                    raise ValueError('missing tree '+name)
+                if command == 'utree' and tree.rooted is None:
+                    tree = tree._replace(rooted=False)
+                yield tree
+            elif not token.startswith('['):
+                skip_command(tokens)
+    elif first_token is not None:
+        tree_count = 1
+        tree = parse_tree(itertools.chain([first_token], tokens), 'tree_1')
+        while tree is not None:
+            yield tree
+            tree_count += 1
+            tree = parse_tree(tokens, 'tree_'+str(tree_count))
+    if in_tree is not sys.stdin:
+        in_tree.close()
+
+
+# Function to replace the tip labels of a tree from a dict of current to new labels and return the tip labels that
+# were not found
+# ============================================================
+
+def translate_labels(tree, label_dict):
+    missing = []
+    for node in range(len(tree.parent)):
+        if not tree.children[node]:
+            if tree.label[node] in label_dict:
+                tree.label[node] = label_dict[tree.label[node]]
+            else:
+                missing.append(tree.label[node])
+    return missing
+
+
+# Function to read a translation table of current and new labels, tab-separated, one pair per line
+# ============================================================
+
+def read_labels(label_file):
+    label_dict = {}
+    for line in open(label_file, 'r'):
+        line = line.rstrip('\n').split('\t')
+        if len(line) >= 2 and line[0]:
+            label_dict[line[0]] = line[1]
+    return label_dict
+
+
+# Function to convert a number to float, or None if it is not a number
+# ============================================================
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Function to return the support value of an internal node from its label (RAxML bipartitions), a support or
+# bootstrap annotation in its comment (FigTree and NEXUS), or a comment holding a single number (RAxML branch
+# labels), or None if it has none
+# ============================================================
+
+def node_support(tree, node):
+    if not tree.children[node]:
+        return None
+    support = to_float(tree.label[node])
+    if support is None and tree.comment[node] is not None:
+        node_comment = tree.comment[node].lstrip('&')
+        support = to_float(node_comment)
+        if support is None:
+            for part in node_comment.split(','):
+                if '=' in part and part.split('=')[0].strip().strip('"').lower() in support_keys:
+                    support = to_float(part.split('=', 1)[1].strip().strip('"'))
+                    break
+    return support
+
+
+# Function to summarize the support values of the internal nodes of a tree, counting the nodes with support at or
+# above each threshold
+# ============================================================
+
+def summarize_support(tree, thresholds=(50, 70, 95)):
+    tip_count = len([x for x in tree.children if not x])
+    support_list = sorted([x for x in [node_support(tree, y) for y in range(len(tree.parent))] if x is not None])
+    count = len(support_list)
+    if not count:
+        return SupportSummary(tip_count, len(tree.parent) - tip_count, 0, None, None, None, None, [(x, 0) for x in thresholds])
+    median = support_list[count // 2] if count % 2 else (support_list[count // 2 - 1] + support_list[count // 2]) / 2.0
+    return SupportSummary(tip_count, len(tree.parent) - tip_count, count, sum(support_list) / count, median,
+                          support_list[0], support_list[-1], [(x, len([y for y in support_list if y >= x])) for x in thresholds])
+
+
+# Function to format the label, comment, and branch length of a node; for NEXUS, a support label of an internal node
+# is written as a "bootstrap values" annotation as in FigTree
+# ============================================================
+
+def node_text(tree, node, nexus=False):
+    node_label = tree.label[node]
+    node_comment = tree.comment[node]
+    if nexus and tree.children[node] and to_float(node_label) is not None:
+        annotation = '&"bootstrap values"='+node_label
+        if node_comment is None:
+            node_comment = annotation
+        elif node_comment.startswith('&'):
+            node_comment = annotation+','+node_comment[1:]
+        node_label = None
+    text = quote(node_label) if node_label is not None else ''
+    if node_comment is not None:
+        text += '['+node_comment+']'
+    if tree.length[node] is not None:
+        text += ':'+tree.length[node]
+    return text
+
+
+# Function to format a tree in Newick, walking the node arrays with an explicit stack of nodes and child positions
+# ============================================================
+
+def format_newick(tree, nexus=False):
+    parts = []
+    stack = [(0, 0)]
+    while stack:
+        node, index = stack.pop()
+        node_children = tree.children[node]
+        if index < len(node_children):
+            parts.append('(' if index == 0 else ',')
+            stack.append((node, index + 1))
+            stack.append((node_children[index], 0))
+        else:
+            if node_children:
+                parts.append(')')
+            parts.append(node_text(tree, node, nexus))
+    return ''.join(parts)+';'
+
+
+# Function to write the start of a NEXUS trees block
+# ============================================================
+
+def write_nexus_start(out_nexus):
+    out_nexus.write('#NEXUS\nbegin trees;\n')
+
+
+# Function to write a tree as a command of a NEXUS trees block
+# ============================================================
+
+def write_nexus_tree(out_nexus, tree):
+    rooting = {True: '[&R] ', False: '[&U] ', None: ''}[tree.rooted]
+    out_nexus.write('\ttree '+quote(tree.name or 'tree')+' = '+rooting+format_newick(tree, True)+'\n')
+
+
+# Function to write the end of a NEXUS trees block
+# ============================================================
+
+def write_nexus_end(out_nexus):
+    out_nexus.write('end;\n')
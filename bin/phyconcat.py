@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, glob, os, sys
+import metrics
+import numpy
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script concatenates per-gene fasta alignments into a phylip supermatrix (output.phy) and a RAxML partition file (output_partitions.txt). Species are translated to taxon names (taxon1, taxon2, ...) in sorted order, and species missing from a gene are padded with gaps. Each alignment is read once into a preallocated matrix of one byte per site; the width of each gene is taken from its first sequence.')
+parser.add_argument("-d", "--dict", metavar='STR', help="output file name for the species to taxon translation table [output_translate.dict]", type=str)
+parser.add_argument("-e", "--extractlogs", metavar='STR', help="quoted glob of extractgb.py logs naming the species to translate [species in alignments]", type=str)
+parser.add_argument("-l", "--log", metavar='STR', help="output file name for log of genes concatenated [stderr]", type=str, default='stderr')
+parser.add_argument("-o", "--output", metavar='STR', help="output prefix [output]", type=str, default='output')
+parser.add_argument("-s", "--silent", help="run script in silent mode", action='store_true')
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("alignment", help="input fasta alignment(s), one per gene; the gene name is the file name up to the first period", type=str, nargs='+')
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set input and output files
+# ============================================================
+
+if not args.dict:
+    args.dict = args.output+'_translate.dict'
+out_log = sys.stderr
+if args.log != 'stderr':
+    out_log = open(args.log, 'w')
+run_metrics = metrics.Metrics(args.metrics, args.profile, sum([os.path.getsize(x) for x in args.alignment]))
+
+
+# Set variables
+# ============================================================
+
+species_set = set()
+taxon_dict = {}
+gene_list = []
+
+
+# Function to read a fasta alignment one sequence at a time; whitespace within sequences (e.g. from Gblocks) is removed
+# ============================================================
+
+def readfasta(file_name):
+    with open(file_name, 'r') as in_fa:
+        fasta_header = None
+        seq_lines = []
+        for line in in_fa:
+            if line.startswith('>'):
+                if fasta_header is not None:
+                    yield fasta_header, ''.join(seq_lines)
+                fasta_header = (line[1:].split() or [''])[0]
+                seq_lines = []
+            elif fasta_header is not None:
+                seq_lines.append(''.join(line.split()))
+        if fasta_header is not None:
+            yield fasta_header, ''.join(seq_lines)
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Set species from the extractgb.py logs or from the alignment headers
+# ============================================================
+
+run_metrics.phase('species')
+if args.extractlogs:
+    log_files = sorted(glob.glob(args.extractlogs))
+    if not log_files:
+        error('no extractgb.py logs found matching '+args.extractlogs, 1)
+    for log_file in log_files:
+        for line in open(log_file, 'r'):
+            line = line.rstrip('\n').split('\t')
+            if len(line) >= 3 and line[0].isdigit():
+                species_set.add(line[1])
+else:
+    for align_file in args.alignment:
+        for line in open(align_file, 'r'):
+            if line.startswith('>'):
+                species_set.add((line[1:].split() or [''])[0])
+
+
+# Set taxon names in sorted species order and write out the translation table
+# ============================================================
+
+species_list = sorted(species_set)
+out_dict = open(args.dict, 'w')
+for row, species in enumerate(species_list):
+    taxon_dict[species] = row
+    out_dict.write(species+'\ttaxon'+str(row + 1)+'\n')
+out_dict.close()
+
+
+# Set the columns of each gene from the first sequence of its alignment
+# ============================================================
+
+len_record_seq = 0
+for align_file in args.alignment:
+    first_record = next(readfasta(align_file), None)
+    if not first_record or not first_record[1]:
+        if not args.silent:
+            out_log.write("Skipping alignment "+align_file+" as it contains no sequences.\n")
+        continue
+    gene_list.append((os.path.basename(align_file).split('.')[0], align_file, len_record_seq, len_record_seq + len(first_record[1])))
+    len_record_seq += len(first_record[1])
+
+
+# Allocate the gap-padded matrix and stream each alignment into its columns
+# ============================================================
+
+run_metrics.phase('concatenate')
+matrix = numpy.empty((len(species_list), len_record_seq), dtype=numpy.uint8)
+matrix.fill(ord('-'))
+filled = numpy.zeros(len(species_list), dtype=bool)
+for gene_name, align_file, start_col, end_col in gene_list:
+    filled.fill(False)
+    count = 0
+    for fasta_header, gene_seq in readfasta(align_file):
+        if fasta_header not in taxon_dict:
+            error('species '+fasta_header+' in '+align_file+' not found in '+args.extractlogs, 1)
+        row = taxon_dict[fasta_header]
+        if filled[row]:
+            error('species '+fasta_header+' is found more than once in '+align_file, 1)
+        if len(gene_seq) != end_col - start_col:
+            error('species '+fasta_header+' has '+str(len(gene_seq))+' sites instead of '+str(end_col - start_col)+' in '+align_file, 1)
+        matrix[row, start_col:end_col] = numpy.frombuffer(gene_seq, dtype=numpy.uint8)
+        filled[row] = True
+        count += 1
+        run_metrics.count(1)
+    if not args.silent:
+        out_log.write("Concatenating "+str(count)+" species and "+str(end_col - start_col)+" sites for "+gene_name+".\n")
+
+
+# Write out the phylip supermatrix with taxon names
+# ============================================================
+
+run_metrics.phase('write')
+out_phy = open(args.output+'.phy', 'w', 1048576)
+out_phy.write(' '+str(len(species_list))+' '+str(len_record_seq)+'\n')
+for row in range(len(species_list)):
+    out_phy.write(('taxon'+str(row + 1)).ljust(13)+matrix[row].tobytes()+'\n')
+out_phy.close()
+
+
+# Write out the RAxML partition file
+# ============================================================
+
+out_partitions = open(args.output+'_partitions.txt', 'w')
+for gene_name, align_file, start_col, end_col in gene_list:
+    out_partitions.write('DNA, '+gene_name+' = '+str(start_col + 1)+'-'+str(end_col)+'\n')
+out_partitions.close()
+
+
+# Close output files
+# ============================================================
+
+if args.log != 'stderr':
+    out_log.close()
+run_metrics.close()
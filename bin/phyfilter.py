@@ -29,23 +29,35 @@
 # Import modules
 # ============================================================
 
-import argparse, os, sys
-from Bio import SeqIO
+import argparse, hashlib, os, sys
+import metrics
+import numpy
 
 
 # Parse arguments
 # ============================================================
 
-parser = argparse.ArgumentParser(description='This script removes individuals without any data and duplicate individuals.')
+parser = argparse.ArgumentParser(description='This script removes individuals without any data and duplicate individuals. The alignment is read into a matrix of one byte per site, and duplicates are found by the digest of each row.')
 parser.add_argument("-l", "--log", metavar='STR', help="output file name for log of species extracted [stderr]", type=str, default='stderr')
+parser.add_argument("-m", "--memmap", metavar='STR', help="file name for a memory-mapped matrix instead of holding the matrix in memory [none]", type=str)
 parser.add_argument("-o", "--output", metavar='STR', help="output prefix [stdout]", type=str, default='stdout')
 parser.add_argument("-s", "--silent", help="run script in silent mode", action='store_true')
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
 parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
 required = parser.add_argument_group('required arguments')
 required.add_argument("input", help="input phylip file", type=str)
 args = parser.parse_args()
 
 
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
 # Set input and output files
 # ============================================================
 
@@ -56,60 +68,96 @@ if args.output != 'stdout':
 out_log = sys.stderr
 if args.log != 'stderr':
     out_log = open(args.log, 'w')
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.input))
 
 
 # Set variables
 # ============================================================
 
-keep_indv = []
-seen_seq = []
-indv_seq = {}
-seq_indv = {}
+seen_seq = {}
+indv_names = []
 
 
 ###############################################################################
 # Run
 ###############################################################################
 
-# Parse input phy file
+# Read phylip header and allocate the matrix
 # ============================================================
 
-for record in SeqIO.parse(in_phy, "phylip"):
+run_metrics.phase('read')
+header = in_phy.readline().split()
+if len(header) < 2:
+    error('phylip header with the number of individuals and sites not found in '+args.input, 1)
+num_indv = int(header[0])
+len_record_seq = int(header[1])
+if args.memmap:
+    matrix = numpy.memmap(args.memmap, dtype=numpy.uint8, mode='w+', shape=(num_indv, len_record_seq))
+else:
+    matrix = numpy.empty((num_indv, len_record_seq), dtype=numpy.uint8)
+filled = [0] * num_indv
+keep_indv = numpy.zeros(num_indv, dtype=bool)
+
+
+# Stream sequential or interleaved phylip rows into the matrix
+# ============================================================
 
-    # Skip records with only missing data
-    # ============================================================
+row = 0
+for line in in_phy:
+    line = line.strip()
+    if not line:
+        continue
+    if len(indv_names) < num_indv:
+        line = line.split(None, 1)
+        indv_names.append(line[0])
+        line = line[1] if len(line) > 1 else ''
+    elif row == num_indv:
+        row = 0
+    line = line.replace(' ', '')
+    if filled[row] + len(line) > len_record_seq:
+        error('individual '+indv_names[row]+' has more than '+str(len_record_seq)+' sites', 1)
+    matrix[row, filled[row]:filled[row] + len(line)] = numpy.frombuffer(line, dtype=numpy.uint8)
+    filled[row] += len(line)
+    row += 1
+for row in range(num_indv):
+    if row >= len(indv_names) or filled[row] != len_record_seq:
+        error('expected '+str(num_indv)+' individuals with '+str(len_record_seq)+' sites in '+args.input, 1)
+
+
+# Find records with only missing data
+# ============================================================
 
-    len_record_seq = len(record.seq)
-    if record.seq.count('-') == len_record_seq:
-        if not args.silent:
-            out_log.write("Skipping record "+record.id+" due to it only containing -'s.\n")
+run_metrics.phase('filter')
+all_gap = (matrix == ord('-')).all(axis=1)
 
-    # Skip duplicate records
-    # ============================================================
 
-    elif record.seq in seen_seq:
-        rm_old_name = seq_indv[record.seq]
-        if rm_old_name in keep_indv:
-            keep_indv.remove(rm_old_name)
-        if not args.silent:
-            out_log.write("Skipping duplicate records "+record.id+" and "+rm_old_name+".\n")
+# Skip records with only missing data and duplicate records
+# ============================================================
 
+for row in range(num_indv):
+    run_metrics.count(1)
+    if all_gap[row]:
+        if not args.silent:
+            out_log.write("Skipping record "+indv_names[row]+" due to it only containing -'s.\n")
+        continue
+    digest = hashlib.sha1(matrix[row].tobytes()).digest()
+    if digest in seen_seq:
+        rm_old_row = seen_seq[digest]
+        keep_indv[rm_old_row] = False
+        if not args.silent:
+            out_log.write("Skipping duplicate records "+indv_names[row]+" and "+indv_names[rm_old_row]+".\n")
     else:
-        keep_indv.append(record.id)
-        seen_seq.append(record.seq)
-        indv_seq[record.id] = record.seq
-        seq_indv[record.seq] = record.id
+        keep_indv[row] = True
+        seen_seq[digest] = row
 
 
 # Write out keep_indv
 # ============================================================
 
-out_phy.write(' '+str(len(keep_indv))+' '+str(len_record_seq)+'\n')
-for item in keep_indv:
-    rec_item = item
-    for i in range(len(item),13):
-        item = item+' '
-    out_phy.write(str(item)+str(indv_seq[rec_item])+'\n')
+run_metrics.phase('write')
+out_phy.write(' '+str(int(keep_indv.sum()))+' '+str(len_record_seq)+'\n')
+for row in numpy.flatnonzero(keep_indv):
+    out_phy.write(indv_names[row].ljust(13)+matrix[row].tobytes()+'\n')
 
 
 # Close input and output files
@@ -120,3 +168,4 @@ if args.output != 'stdout':
     out_phy.close()
 if args.log != 'stderr':
     out_log.close()
+run_metrics.close()
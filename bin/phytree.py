@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, sys
+import metrics, newick
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script reads the trees of a Newick or NEXUS file (e.g. RAxML_bipartitions.RAxML from RAxML) in a single pass, replaces their tip labels from a translation table (e.g. the taxon numbers of phyconcat.py back to species names), logs a summary of the support values of the internal nodes of each tree, and writes the trees out in Newick and, if requested, NEXUS format with the support values as annotations.')
+parser.add_argument("-d", "--dict", metavar='STR', help="translation table of current and new tip labels, tab-separated, one pair per line (e.g. taxon1 and the species name) [none]", type=str)
+parser.add_argument("-l", "--log", metavar='STR', help="output file name for log of the support summary of each tree [stderr]", type=str, default='stderr')
+parser.add_argument("-n", "--nexus", metavar='STR', help="output file name for the trees in NEXUS format [none]", type=str)
+parser.add_argument("-o", "--output", metavar='STR', help="output file name for the trees in Newick format [input file name with .out before the extension]", type=str)
+parser.add_argument("-t", "--thresholds", metavar='STR', help="comma-separated support values to count the internal nodes at or above [50,70,95]", type=str, default='50,70,95')
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("input", help="input Newick or NEXUS tree file", type=str)
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set input and output files
+# ============================================================
+
+if not os.path.exists(args.input):
+    error('tree file '+args.input+' not found', 1)
+if not args.output:
+    args.output = os.path.splitext(args.input)[0]+'.out'+os.path.splitext(args.input)[1]
+try:
+    thresholds = [float(x) for x in args.thresholds.split(',')]
+except ValueError:
+    error('thresholds '+args.thresholds+' are not numbers', 1)
+label_dict = newick.read_labels(args.dict) if args.dict else None
+out_log = sys.stderr
+if args.log != 'stderr':
+    out_log = open(args.log, 'w')
+out_tree = open(args.output, 'w')
+out_nexus = None
+if args.nexus:
+    out_nexus = open(args.nexus, 'w')
+    newick.write_nexus_start(out_nexus)
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.input))
+
+
+# Function to format a number for the log without trailing zeros
+# ============================================================
+
+def number_text(value):
+    return '%g' % round(value, 2)
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Translate, summarize, and write out each tree as it is read
+# ============================================================
+
+run_metrics.phase('trees')
+tree_count = 0
+try:
+    for tree in newick.read_trees(args.input):
+        tree_count += 1
+        if label_dict is not None:
+            missing = newick.translate_labels(tree, label_dict)
+            if missing:
+                out_log.write("Tree "+str(tree.name)+": "+str(len(missing))+" tip labels not in the translation table ("
+                              +', '.join(sorted(missing)[:10])+(', ...' if len(missing) > 10 else '')+").\n")
+        summary = newick.summarize_support(tree, thresholds)
+        run_metrics.count(1, summary.tips)
+        out_log.write("Tree "+str(tree.name)+": "+str(summary.tips)+" tips, "+str(summary.internal)+" internal nodes, "
+                      +str(summary.count)+" with support values.\n")
+        if summary.count:
+            out_log.write("Support: average "+number_text(summary.mean)+", median "+number_text(summary.median)+", minimum "
+                          +number_text(summary.minimum)+", maximum "+number_text(summary.maximum)+".\n")
+            for threshold, count in summary.at_least:
+                out_log.write("Nodes with support >= "+number_text(threshold)+": "+str(count)+" ("
+                              +str(int(count*100/summary.count))+"%).\n")
+        out_tree.write(newick.format_newick(tree)+'\n')
+        if out_nexus is not None:
+            newick.write_nexus_tree(out_nexus, tree)
+except ValueError as exception:
+    error(str(exception), 1)
+if not tree_count:
+    error('no trees found in '+args.input, 1)
+
+
+# Close output files
+# ============================================================
+
+if out_nexus is not None:
+    newick.write_nexus_end(out_nexus)
+    out_nexus.close()
+out_tree.close()
+if args.log != 'stderr':
+    out_log.close()
+run_metrics.close()
@@ -35,8 +35,10 @@ COMMAND="$0 $*";
 DATE=`date +%F`;
 ESEARCH=`which esearch`;
 EFETCH=`which efetch`;
+EPOST=`which epost || true`;
 SCRIPTSDIR=`dirname $0`
 WORKDIR=`pwd`
+WORKERS=1
 
 
 # Error function
@@ -56,17 +58,26 @@ function usage () {
     printf "\n" >&2;
     printf "%s v%s \n" `basename $0` $VERSION >&2;
     printf "\n" >&2;
-    printf "Usage: %s [-efetch STR] [-esearch STR] [-workdir STR] [-txid INT] [-help] [-h] \n" `basename $0` >&2;
+    printf "Usage: %s [-compress] [-efetch STR] [-epost STR] [-esearch STR] [-profile] [-update] [-workdir STR] [-workers INT] [-txid INT | -txids STR] [-help] [-h] \n" `basename $0` >&2;
     printf "\n" >&2;
     printf "Prep script to download GenBanks records for taxonomic classification of phylogeny.\n" >&2;
     printf "\n" >&2;
     printf "Required arguments:\n" >&2;
     printf "       -txid INT           taxonomy ID from NCBI for classification\n" >&2;
+    printf "       -txids STR          file of taxonomy IDs from NCBI, one per line, prepped together into one shared\n" >&2;
+    printf "                           set of GenBank records with the accessions and gene reports of each clade in\n" >&2;
+    printf "                           prep/clades/; each run downloads only records missing from the shared records\n" >&2;
     printf "\n" >&2;
     printf "Optional arguments:\n" >&2;
+    printf "       -compress           store GenBank records BGZF-compressed (NCBI_full.gb.gz)\n" >&2;
     printf "       -efetch STR         path for efetch if not in PATH [efetch]\n" >&2;
+    printf "       -epost STR          path for epost if not in PATH (-txids only) [epost]\n" >&2;
     printf "       -esearch STR        path for esearch if not in PATH [esearch]\n" >&2;
+    printf "       -profile            profile the python scripts with cProfile (prep/metrics/*.json.prof)\n" >&2;
+    printf "       -update             download only records modified since the last download and merge them\n" >&2;
+    printf "                           into the existing GenBank records (NCBI_full.gb.delta lists changed genes)\n" >&2;
     printf "       -workdir STR        path for working directory [pwd]\n" >&2;
+    printf "       -workers INT        worker processes for analyzing GenBank records [1]\n" >&2;
     printf "\n" >&2;
 }
 
@@ -75,13 +86,22 @@ function usage () {
 # ============================================================
 
 HELP_MESSAGE=;
+COMPRESS=;
+PROFILE=;
+UPDATE=;
 
 while [[ -n $@ ]]; do
     case "$1" in
         '-workdir') shift; WORKDIR=$1;;
+        '-workers') shift; WORKERS=$1;;
         '-txid') shift; TXID=$1;;
+        '-txids') shift; TXIDS=$1;;
         '-efetch') shift; EFETCH=$1;;
+        '-epost') shift; EPOST=$1;;
+        '-compress') COMPRESS=1;;
         '-esearch') shift; ESEARCH=$1;;
+        '-profile') PROFILE=--profile;;
+        '-update') UPDATE=1;;
         '-help') HELP_MESSAGE=1;;
         '-h') HELP_MESSAGE=1;;
         -*) usage; error 2 "Invalid option: ${1}";;
@@ -97,15 +117,23 @@ if [[ -n "${HELP_MESSAGE}" ]]; then
 elif [[ -z "${WORKDIR}" || ! -d "${WORKDIR}" ]]; then
     usage; error 1 "WORKDIR not defined or does not exist";
 
-elif [[ -z "${TXID}" ]]; then
+elif [[ -z "${TXID}" && -z "${TXIDS}" ]]; then
     usage; error 1 "TXID not defined";
 
+elif [[ -n "${TXID}" && -n "${TXIDS}" ]]; then
+    usage; error 1 "TXID and TXIDS both defined";
+
+elif [[ -n "${TXIDS}" && ! -s "${TXIDS}" ]]; then
+    usage; error 1 "TXIDS file does not exist or is empty";
+
 else
     printf "[%s] Starting %s %s %s %s %s %s\n" `basename $0` `date`     >&2;
     printf "[%s] Command-line: $COMMAND\n" `basename $0` >&2;
     printf "[%s] Version: $VERSION\n" `basename $0` >&2;
     printf "[%s] PARAM: %s = %s\n" `basename $0` "WORKDIR"     $WORKDIR   >&2;
     printf "[%s] PARAM: %s = %s\n" `basename $0` "TXID"        $TXID    >&2;
+    printf "[%s] PARAM: %s = %s\n" `basename $0` "TXIDS"       $TXIDS   >&2;
+    printf "[%s] PARAM: %s = %s\n" `basename $0` "WORKERS"     $WORKERS >&2;
 fi
 
 
@@ -114,6 +142,9 @@ fi
 
 PYTHON=`which python`;
 ALLGENESINGB="${SCRIPTSDIR}/allgenesingb.py";
+CLADEGB="${SCRIPTSDIR}/cladegb.py";
+INDEXGB="${SCRIPTSDIR}/indexgb.py";
+MERGEGB="${SCRIPTSDIR}/mergegb.py";
 
 if [[ -z "${ESEARCH}" || ! -x "${ESEARCH}" ]]; then
     error 127 "esearch not in PATH env variable or not executable";
@@ -121,11 +152,23 @@ if [[ -z "${ESEARCH}" || ! -x "${ESEARCH}" ]]; then
 elif [[ -z "${EFETCH}" || ! -x "${EFETCH}" ]]; then
     error 127 "efetch not in PATH env variable or not executable";
 
+elif [[ -n "${TXIDS}" && ( -z "${EPOST}" || ! -x "${EPOST}" ) ]]; then
+    error 127 "epost not in PATH env variable or not executable";
+
 elif [[ -z "${PYTHON}" || ! -x "${PYTHON}" ]]; then
     error 127 "python not in PATH env variable or not executable";
 
 elif [[ -z "${ALLGENESINGB}" || ! -x "${ALLGENESINGB}" ]]; then
     error 127 "allgenesingb.py not found or not executable";
+
+elif [[ -z "${CLADEGB}" || ! -x "${CLADEGB}" ]]; then
+    error 127 "cladegb.py not found or not executable";
+
+elif [[ -z "${INDEXGB}" || ! -x "${INDEXGB}" ]]; then
+    error 127 "indexgb.py not found or not executable";
+
+elif [[ -z "${MERGEGB}" || ! -x "${MERGEGB}" ]]; then
+    error 127 "mergegb.py not found or not executable";
 fi
 
     
@@ -133,28 +176,111 @@ fi
 # Run
 ###############################################################################
 
-# Make prep directory
+# Make prep directory; each python script writes its run metrics to prep/metrics
 # ============================================================
 
-mkdir -p $WORKDIR/prep;
+mkdir -p $WORKDIR/prep/metrics;
+METRICS=$WORKDIR/prep/metrics;
 
 
-# Download GenBank records
+# List the accessions of each clade and download only the records missing from, or newer than, the shared GenBank
+# records, merging them by accession.version; nested and overlapping clades share one copy of each record
 # ============================================================
 
-printf "[%s] Downloading GenBank records \n" `basename $0` >&2;
-$ESEARCH -db nucleotide -query "txid${TXID}[Organism] biomol_genomic[PROP]" | $EFETCH -format gb > $WORKDIR/prep/NCBI_full.gb;
+if [[ -n "${TXIDS}" ]]; then
+    mkdir -p $WORKDIR/prep/clades;
+    GBFILE=NCBI_full.gb;
+    if [[ -f $WORKDIR/prep/NCBI_full.gb.gz || ( -n "${COMPRESS}" && ! -f $WORKDIR/prep/NCBI_full.gb ) ]]; then
+        GBFILE=NCBI_full.gb.gz;
+    fi
+    CLADES=;
+    for CLADE in `grep -v '^#' $TXIDS | awk '{print $1}'`; do
+        printf "[%s] Listing GenBank accessions of txid %s \n" `basename $0` $CLADE >&2;
+        $ESEARCH -db nucleotide -query "txid${CLADE}[Organism] biomol_genomic[PROP]" | $EFETCH -format acc > $WORKDIR/prep/clades/$CLADE.query;
+        CLADES="$CLADES $WORKDIR/prep/clades/$CLADE.query";
+    done
+    $PYTHON $CLADEGB $PROFILE --metrics $METRICS/cladegb.missing.json --silent $WORKDIR/prep/$GBFILE $CLADES;
+
+    if [[ -s $WORKDIR/prep/$GBFILE.missing ]]; then
+        printf "[%s] Downloading %s GenBank records missing from the shared records \n" `basename $0` `cat $WORKDIR/prep/$GBFILE.missing | wc -l` >&2;
+        if [[ -s $WORKDIR/prep/$GBFILE.idx ]]; then
+            KEYS=`ls $WORKDIR/*/*.key 2>/dev/null | awk '{printf "--key %s ", $0}'`;
+            $EPOST -db nucleotide < $WORKDIR/prep/$GBFILE.missing | $EFETCH -format gb | $PYTHON $MERGEGB $PROFILE --metrics $METRICS/mergegb.json $KEYS --report $WORKDIR/prep/NCBI_full.gb.delta $WORKDIR/prep/$GBFILE -;
+        elif [[ -n "${COMPRESS}" ]]; then
+            $EPOST -db nucleotide < $WORKDIR/prep/$GBFILE.missing | $EFETCH -format gb | $PYTHON $INDEXGB $PROFILE --metrics $METRICS/indexgb.json --compress $WORKDIR/prep/$GBFILE -;
+        else
+            $EPOST -db nucleotide < $WORKDIR/prep/$GBFILE.missing | $EFETCH -format gb > $WORKDIR/prep/$GBFILE;
+            $PYTHON $INDEXGB $PROFILE --metrics $METRICS/indexgb.json $WORKDIR/prep/$GBFILE;
+        fi
+    fi
+
+    if [[ "$(find ${WORKDIR}/prep/* -maxdepth 0 -type f -name ${GBFILE}.idx -size +1c | wc -l)" -eq 0 ]]; then
+        error 1 "Downloading GenBank records failed; please identify error and restart";
+    fi
+    printf "[%s] Mapping GenBank records to clades \n" `basename $0` >&2;
+    $PYTHON $CLADEGB $PROFILE --metrics $METRICS/cladegb.json $WORKDIR/prep/$GBFILE $CLADES;
+    ANALYZE="--index $WORKDIR/prep/$GBFILE.idx `echo $CLADES | sed 's/\.query\>/.acc/g' | awk '{for (i = 1; i <= NF; i++) printf "--clade %s ", $i}'`";
+
+
+# Download GenBank records modified since the last download and merge them into the existing records, listing
+# the species and genes from the key files whose selections could change
+# ============================================================
+
+elif [[ -n "${UPDATE}" ]]; then
+    GBFILE=NCBI_full.gb;
+    if [[ -f $WORKDIR/prep/NCBI_full.gb.gz ]]; then
+        GBFILE=NCBI_full.gb.gz;
+    fi
+    if [[ ! -s $WORKDIR/prep/$GBFILE.idx || ! -s $WORKDIR/prep/NCBI_full.date ]]; then
+        error 1 "Previous download not found in $WORKDIR/prep; please run without -update first";
+    fi
+    LASTDATE=`cat $WORKDIR/prep/NCBI_full.date`;
+    KEYS=`ls $WORKDIR/*/*.key 2>/dev/null | awk '{printf "--key %s ", $0}'`;
+    printf "[%s] Downloading GenBank records modified since %s \n" `basename $0` $LASTDATE >&2;
+    $ESEARCH -db nucleotide -query "txid${TXID}[Organism] biomol_genomic[PROP] ${LASTDATE}:3000[MDAT]" | $EFETCH -format gb | $PYTHON $MERGEGB $PROFILE --metrics $METRICS/mergegb.json $KEYS --report $WORKDIR/prep/NCBI_full.gb.delta $WORKDIR/prep/$GBFILE -;
+    ANALYZE="--index $WORKDIR/prep/$GBFILE.idx";
+
+
+# Download GenBank records, compressing and indexing them while streaming if requested
+# ============================================================
 
-if [[ "$(find ${WORKDIR}/prep/* -maxdepth 0 -type f -name 'NCBI_full.gb' -size +1c | wc -l)" -eq 0 ]]; then
-    error 1 "Downloading GenBank records failed; please identify error and restart";
+else
+    printf "[%s] Downloading GenBank records \n" `basename $0` >&2;
+    if [[ -n "${COMPRESS}" ]]; then
+        GBFILE=NCBI_full.gb.gz;
+        $ESEARCH -db nucleotide -query "txid${TXID}[Organism] biomol_genomic[PROP]" | $EFETCH -format gb | $PYTHON $INDEXGB $PROFILE --metrics $METRICS/indexgb.json --compress $WORKDIR/prep/$GBFILE -;
+    else
+        GBFILE=NCBI_full.gb;
+        $ESEARCH -db nucleotide -query "txid${TXID}[Organism] biomol_genomic[PROP]" | $EFETCH -format gb > $WORKDIR/prep/$GBFILE;
+    fi
+
+    if [[ "$(find ${WORKDIR}/prep/* -maxdepth 0 -type f -name ${GBFILE} -size +1c | wc -l)" -eq 0 ]]; then
+        error 1 "Downloading GenBank records failed; please identify error and restart";
+    fi
+
+
+    # Index GenBank records by accession for random access
+    # ============================================================
+
+    if [[ -z "${COMPRESS}" ]]; then
+        printf "[%s] Indexing GenBank records \n" `basename $0` >&2;
+        $PYTHON $INDEXGB $PROFILE --metrics $METRICS/indexgb.json $WORKDIR/prep/$GBFILE;
+    fi
+
+    if [[ "$(find ${WORKDIR}/prep/* -maxdepth 0 -type f -name ${GBFILE}.idx -size +1c | wc -l)" -eq 0 ]]; then
+        error 1 "Indexing GenBank records failed; please identify error and restart";
+    fi
+    ANALYZE="--workers $WORKERS";
 fi
 
+date +%Y/%m/%d > $WORKDIR/prep/NCBI_full.date;
+
 
 # Initial query for gene names/counts and feature counts
 # ============================================================
 
 printf "[%s] Analyzing GenBank records \n" `basename $0` >&2;
-$PYTHON $ALLGENESINGB $WORKDIR/prep/NCBI_full.gb;
+$PYTHON $ALLGENESINGB $PROFILE --metrics $METRICS/allgenesingb.json --fast $ANALYZE --output $WORKDIR/prep/NCBI_full.gb $WORKDIR/prep/$GBFILE;
 
 if [[ "$(find ${WORKDIR}/prep/* -maxdepth 0 -type f -name 'NCBI_full.gb.*' -size +1c | wc -l)" -eq 0 ]]; then
     error 1 "Analyzing GenBank records failed; please identify error and restart";
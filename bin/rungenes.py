@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, multiprocessing, os, subprocess, sys, time
+import metrics
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script runs the part scripts made by makephylogenysh.py for many genes at once within a total core budget. The parts of each gene run in order, genes run concurrently, and the free cores are shared among the genes ready to start in proportion to the size of their input, passed to tblastx, MAFFT, and RAxML through the THREADS environment variable. The output of each part is written to gene/log.partN.', epilog='Gene directories and key files must already exist (makephylogenysh.py and part1).')
+parser.add_argument("-a", "--analysis", help="run mafft/analysis.sh with all cores after all genes finish", action='store_true')
+parser.add_argument("-c", "--cores", metavar='INT', help="total cores to share among genes [all cores]", type=int, default=multiprocessing.cpu_count())
+parser.add_argument("-p", "--parts", metavar='STR', help="comma-separated parts to run for each gene [3,4]", type=str, default='3,4')
+parser.add_argument("-s", "--silent", help="run script in silent mode", action='store_true')
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+parser.add_argument("-w", "--workdir", metavar='STR', help="path for working directory [pwd]", type=str, default=os.getcwd())
+required = parser.add_argument_group('required arguments')
+required.add_argument("genename", help="gene name(s)", type=str, nargs='+')
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set variables
+# ============================================================
+
+workdir = os.path.join(os.path.abspath(args.workdir),'')
+parts_list = args.parts.split(',')
+remaining_parts_dict = dict((x, list(parts_list)) for x in args.genename)
+running_list = []
+failed_list = []
+free_cores = args.cores
+run_metrics = metrics.Metrics(args.metrics, args.profile)
+if args.cores < 1:
+    error('at least one core is required', 1)
+
+
+# Function to return the part script of a gene
+# ============================================================
+
+def partscript(gene_name, part):
+    return os.path.join(workdir,gene_name,'')+gene_name+'.part'+part+'.sh'
+
+
+# Function to return the input size of a part of a gene: the extracted sequences if present, otherwise the
+# downloaded GenBank records
+# ============================================================
+
+def inputsize(gene_name):
+    genedir = os.path.join(workdir,gene_name,'')
+    for file_name in [genedir+'extract/sequence.'+gene_name+'.fa', genedir+'NCBI_query.gb']:
+        if os.path.exists(file_name):
+            return max(1, os.path.getsize(file_name))
+    return 1
+
+
+# Function to start a part of a gene with a number of threads
+# ============================================================
+
+def startpart(gene_name, part, threads):
+    if not args.silent:
+        sys.stderr.write("Starting part "+part+" of "+gene_name+" with "+str(threads)+" threads.\n")
+    env = dict(os.environ)
+    env['THREADS'] = str(threads)
+    out_part_log = open(os.path.join(workdir,gene_name,'')+'log.part'+part, 'a')
+    process = subprocess.Popen(['bash', partscript(gene_name, part)], stdout=out_part_log, stderr=subprocess.STDOUT, env=env)
+    out_part_log.close()
+    return process
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Check that the part scripts exist
+# ============================================================
+
+for gene_name in args.genename:
+    for part in parts_list:
+        if not os.path.exists(partscript(gene_name, part)):
+            error(partscript(gene_name, part)+' not found; run makephylogenysh.py for '+gene_name+' first', 1)
+
+
+# Start ready genes with a share of the free cores by input size until all parts finish
+# ============================================================
+
+run_metrics.phase('genes')
+while running_list or [x for x in args.genename if remaining_parts_dict[x]]:
+    running_genes = set([x[1] for x in running_list])
+    ready_list = sorted([x for x in args.genename if remaining_parts_dict[x] and x not in running_genes], key=lambda x: -inputsize(x))
+    total_size = sum([inputsize(x) for x in ready_list])
+    for gene_name in ready_list:
+        if free_cores < 1:
+            break
+        threads = max(1, min(free_cores, int(round(free_cores * float(inputsize(gene_name)) / total_size))))
+        total_size -= inputsize(gene_name)
+        part = remaining_parts_dict[gene_name].pop(0)
+        running_list.append((startpart(gene_name, part, threads), gene_name, part, threads))
+        free_cores -= threads
+
+    # Wait for a part to finish and release its cores; stop later parts of a gene whose part failed
+    # ============================================================
+
+    while running_list and not [x for x in running_list if x[0].poll() is not None]:
+        time.sleep(1)
+    for process, gene_name, part, threads in [x for x in running_list if x[0].returncode is not None]:
+        running_list.remove((process, gene_name, part, threads))
+        free_cores += threads
+        run_metrics.count(1)
+        if process.returncode != 0:
+            failed_list.append(gene_name)
+            remaining_parts_dict[gene_name] = []
+            sys.stderr.write("Part "+part+" of "+gene_name+" failed; see "+os.path.join(workdir,gene_name,'')+'log.part'+part+".\n")
+        elif not args.silent:
+            sys.stderr.write("Finished part "+part+" of "+gene_name+".\n")
+
+
+# Run the analysis script with all cores
+# ============================================================
+
+if failed_list:
+    error('stopped after failures in '+', '.join(failed_list), 1)
+if args.analysis:
+    run_metrics.phase('analysis')
+    if not args.silent:
+        sys.stderr.write("Starting mafft/analysis.sh with "+str(args.cores)+" threads.\n")
+    env = dict(os.environ)
+    env['THREADS'] = str(args.cores)
+    subprocess.check_call(['bash', os.path.join(workdir,'mafft','')+'analysis.sh'], env=env)
+run_metrics.close()
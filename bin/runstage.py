@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, glob, hashlib, os, sys
+import gbtools, metrics
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script checks whether a pipeline stage is up to date or records a finished stage in a manifest. A stage is up to date when its parameters and the content digests of its inputs match the manifest and all of its outputs exist; edits to outputs (e.g. manual curation) do not trigger a rerun. In check mode the exit status is 0 if the stage can be skipped and 1 if it has to be run.', epilog='Usage in a shell script: if ! runstage.py -i in -o out manifest name; then command; runstage.py --record -i in -o out manifest name; fi')
+parser.add_argument("-i", "--input", metavar='STR', help="input file or quoted glob of the stage; may be given multiple times [none]", type=str, action='append', default=[])
+parser.add_argument("-o", "--output", metavar='STR', help="output file of the stage; may be given multiple times [none]", type=str, action='append', default=[])
+parser.add_argument("-p", "--params", metavar='STR', help="parameters of the stage, usually the command line [none]", type=str, default='')
+parser.add_argument("-r", "--record", help="record the stage as finished instead of checking it", action='store_true')
+parser.add_argument("-s", "--silent", help="run script in silent mode", action='store_true')
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("manifest", help="manifest file of stage digests", type=str)
+required.add_argument("stage", help="stage name", type=str)
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set variables
+# ============================================================
+
+stage_dict = {}
+digest_dict = {}
+params_digest = hashlib.sha1(args.params).hexdigest()
+run_metrics = metrics.Metrics(args.metrics, args.profile)
+
+
+# Function to return the sha1 digest of a file, reusing the manifest digest if the size and mtime are unchanged
+# ============================================================
+
+def filedigest(file_name):
+    if not os.path.isfile(file_name):
+        return '-'
+    signature = gbtools.file_signature(file_name)
+    if signature in digest_dict:
+        return digest_dict[signature]
+    run_metrics.count(1)
+    digest = hashlib.sha1()
+    with open(file_name, 'rb') as in_file:
+        for block in iter(lambda: in_file.read(1048576), ''):
+            digest.update(block)
+    digest_dict[signature] = digest.hexdigest()
+    return digest_dict[signature]
+
+
+# Function to expand input globs into a sorted list of files; a glob without matches is kept as a missing file
+# ============================================================
+
+def expandinputs(input_list):
+    file_list = []
+    for input_glob in input_list:
+        file_list.extend(sorted(glob.glob(input_glob)) or [input_glob])
+    return [os.path.abspath(x) for x in file_list]
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Read manifest
+# ============================================================
+
+run_metrics.phase('manifest')
+if os.path.exists(args.manifest):
+    stage_name = None
+    for line in open(args.manifest, 'r'):
+        line = line.rstrip('\n').split('\t')
+        if line[0].startswith('>'):
+            stage_name = line[0][1:]
+            stage_dict[stage_name] = [line[1], []]
+        elif stage_name is not None and len(line) == 5:
+            stage_dict[stage_name][1].append((line[0], '\t'.join(line[1:4]), line[4]))
+            if line[4] != '-':
+                digest_dict['\t'.join(line[1:4])] = line[4]
+
+
+# Set input files and their digests
+# ============================================================
+
+run_metrics.phase('digest')
+input_files = expandinputs(args.input)
+output_files = [os.path.abspath(x) for x in args.output]
+current = [(x, filedigest(x)) for x in input_files]
+
+
+# Check mode: exit 0 if the stage can be skipped, otherwise 1
+# ============================================================
+
+if not args.record:
+    reason = None
+    if args.stage not in stage_dict:
+        reason = 'it has not been run'
+    elif stage_dict[args.stage][0] != params_digest:
+        reason = 'its parameters changed'
+    elif [(x[1].split('\t')[0], x[2]) for x in stage_dict[args.stage][1] if x[0] == 'input'] != current:
+        reason = 'its inputs changed'
+    else:
+        for output_file in output_files:
+            if not os.path.exists(output_file):
+                reason = 'output '+output_file+' is missing'
+                break
+    if not args.silent:
+        if reason:
+            sys.stderr.write("Running stage "+args.stage+" as "+reason+".\n")
+        else:
+            sys.stderr.write("Skipping stage "+args.stage+" as its inputs are unchanged.\n")
+    run_metrics.close()
+    sys.exit(1 if reason else 0)
+
+
+# Record mode: replace the stage in the manifest with the current digests
+# ============================================================
+
+run_metrics.phase('record')
+stage_dict[args.stage] = [params_digest, []]
+for kind, file_list in (('input', input_files), ('output', output_files)):
+    for file_name in file_list:
+        if not os.path.isfile(file_name):
+            if kind == 'output':
+                error('output '+file_name+' of stage '+args.stage+' not found', 1)
+            stage_dict[args.stage][1].append((kind, file_name+'\t-\t-', '-'))
+        else:
+            stage_dict[args.stage][1].append((kind, gbtools.file_signature(file_name), filedigest(file_name)))
+out_manifest = open(args.manifest+'.tmp', 'w')
+for stage_name in sorted(stage_dict):
+    out_manifest.write('>'+stage_name+'\t'+stage_dict[stage_name][0]+'\n')
+    for kind, signature, digest in stage_dict[stage_name][1]:
+        out_manifest.write(kind+'\t'+signature+'\t'+digest+'\n')
+out_manifest.close()
+os.rename(args.manifest+'.tmp', args.manifest)
+run_metrics.close()
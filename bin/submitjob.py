@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, os, sys, time
+import jobqueue, metrics
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script adds a job to a queue directory drained by gbworker.py and optionally waits for it to finish. An extract job selects the genes of the keys as extractgb.py --index does; a names job lists the gene names of a gb file not in the key as genenamesfromgb.py --fast does.')
+parser.add_argument("-a", "--accessions", metavar='STR', help="extract: file of accessions to consider, one per line [all]", type=str)
+parser.add_argument("-i", "--input", metavar='STR', help="input gb file; extract jobs must use the gb file of the worker [gb file of the worker]", type=str)
+parser.add_argument("-j", "--job-metrics", metavar='STR', help="output file name for JSON metrics of the job [none]", type=str)
+parser.add_argument("-k", "--key", metavar='STR', help="gene names key, or for extract jobs a directory of .key files; repeat for several keys", type=str, action='append', default=[])
+parser.add_argument("-l", "--log", metavar='STR', help="extract: output file name for log of species extracted [stderr of the worker]", type=str)
+parser.add_argument("-o", "--output", metavar='STR', help="output prefix [extract: sequence; names: input file name]", type=str)
+parser.add_argument("-p", "--split", help="extract: write one fasta file per species (output#.GENE.fa) instead of one multi-fasta file per gene", action='store_true')
+parser.add_argument("-s", "--silent", help="extract: do not log skipped entries and key names", action='store_true')
+parser.add_argument("-t", "--table", metavar='STR', help="extract: output file name for a provenance table of the extracted genes [none]", type=str)
+parser.add_argument("-w", "--wait", help="wait for the job to finish and exit with status 1 if it failed", action='store_true')
+parser.add_argument("-x", "--timeout", metavar='FLOAT', help="minutes to wait with --wait before exiting with status 2 [none]", type=float)
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("queue", help="queue directory", type=str)
+required.add_argument("type", help="job type", type=str, choices=['extract', 'names'])
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set variables
+# ============================================================
+
+if not args.key:
+    error('at least one key is required', 1)
+if args.type == 'names' and len(args.key) > 1:
+    error('names jobs take a single key', 1)
+run_metrics = metrics.Metrics(args.metrics, args.profile)
+fields = [('type', args.type)] + [('key', os.path.abspath(x)) for x in args.key]
+for field, value in [('input', args.input), ('accessions', args.accessions), ('log', args.log), ('output', args.output),
+                     ('table', args.table), ('metrics', args.job_metrics)]:
+    if value:
+        fields.append((field, os.path.abspath(value)))
+if args.split:
+    fields.append(('split', '1'))
+if args.silent:
+    fields.append(('silent', '1'))
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Submit job
+# ============================================================
+
+run_metrics.phase('submit')
+job_name = jobqueue.submit_job(args.queue, args.type+'.'+os.path.basename(args.key[0]).split('.')[0], fields)
+sys.stdout.write(job_name+'\n')
+
+
+# Wait for the job to finish
+# ============================================================
+
+if args.wait:
+    run_metrics.phase('wait')
+    start_time = time.time()
+    while True:
+        state, job_file = jobqueue.job_state(args.queue, job_name)
+        if state in ('done', 'failed'):
+            break
+        if args.timeout is not None and time.time() - start_time > args.timeout * 60:
+            error('job '+job_name+' did not finish within '+str(args.timeout)+' minutes', 2)
+        time.sleep(2)
+    if state == 'failed':
+        error('job '+job_name+' failed: '+jobqueue.job_value(jobqueue.read_job(job_file), 'message', 'unknown error'), 1)
+run_metrics.close()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+# Copyright (c)2017. The Regents of the University of California (Regents).
+# All Rights Reserved. Permission to use, copy, modify, and distribute this
+# software and its documentation for educational, research, and
+# not-for-profit purposes, without fee and without a signed licensing
+# agreement, is hereby granted, provided that the above copyright notice,
+# this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact the Office of Technology
+# Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA
+# 94720-1620, (510) 643-7201, for commercial licensing opportunities.
+
+# IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT,
+# SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS,
+# ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF
+# REGENTS HAS BEEN ADVISED OF THE POSSIBILITY OF SUCH DAMAGE
+
+# REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+# HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+# MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+# Import modules
+# ============================================================
+
+import argparse, hashlib, os, subprocess, sys, tempfile, time
+import metrics
+
+
+# Parse arguments
+# ============================================================
+
+parser = argparse.ArgumentParser(description='This script updates a MAFFT alignment of a gene after its extracted sequences change. Sequences that are new or changed since the alignment was made (recorded in output.digests) are added to the existing alignment with mafft --add --keeplength, so manual curation of the alignment is kept; sequences removed from the input are dropped from the alignment. The input is realigned from scratch if there is no alignment yet or if more than the realign share of the sequences changed. The strategy for a full realignment is chosen from the number and lengths of the sequences: the most accurate of E-INS-i, L-INS-i, FFT-NS-i, FFT-NS-2, and PartTree that MAFFT recommends for the number of sequences and whose estimated runtime fits the budget. Each run is appended to the strategy log, and the runtimes of past runs calibrate the estimates.')
+parser.add_argument("-b", "--budget", metavar='FLOAT', help="time budget in minutes for a full realignment [none]", type=float)
+parser.add_argument("-f", "--full", metavar='STR', help="MAFFT options for a full realignment, or auto to choose a strategy [auto]", type=str, default='auto')
+parser.add_argument("-l", "--log", metavar='STR', help="tab-separated log of the strategy, size, and runtime of each run, appended to and used to calibrate runtime estimates [output.strategy]", type=str)
+parser.add_argument("-m", "--mafft", metavar='STR', help="path for MAFFT [mafft]", type=str, default='mafft')
+parser.add_argument("-r", "--realign", metavar='FLOAT', help="share of new, changed, or removed sequences above which the input is realigned from scratch [0.25]", type=float, default=0.25)
+parser.add_argument("-s", "--silent", help="run script in silent mode", action='store_true')
+parser.add_argument("-t", "--threads", metavar='INT', help="threads for MAFFT [1]", type=str, default='1')
+parser.add_argument("--metrics", metavar='STR', help="output file name for JSON run metrics with per-phase wall and CPU time, records and features processed, bytes read, peak memory and progress [none]", type=str)
+parser.add_argument("--profile", help="profile the run with cProfile and write the stats to the metrics file name.prof (requires --metrics)", action='store_true')
+parser.add_argument("-v", "--version", help="show version info and exit", action='version', version='%(prog)s 0.1')
+required = parser.add_argument_group('required arguments')
+required.add_argument("input", help="input fasta file of extracted sequences", type=str)
+required.add_argument("output", help="output alignment, updated in place if it exists", type=str)
+args = parser.parse_args()
+
+
+# Error function
+# ============================================================
+
+def error(output, number):
+    sys.stderr.write('['+os.path.basename(sys.argv[0])+']: '+output+'\n')
+    sys.exit(number)
+
+
+# Set variables
+# ============================================================
+
+digest_file = args.output+'.digests'
+if not args.log:
+    args.log = args.output+'.strategy'
+strategy_list = [('E-INS-i', '--maxiterate 1000000 --genafpair', 200, 10000, 5e-4),
+                 ('L-INS-i', '--maxiterate 1000 --localpair', 2000, 10000, 2e-4),
+                 ('FFT-NS-i', '--retree 2 --maxiterate 1000', 20000, None, 2e-6),
+                 ('FFT-NS-2', '--retree 2 --maxiterate 0', 50000, None, 5e-7),
+                 ('PartTree', '--parttree --retree 2', None, None, 1e-7)]
+aligned_digest_dict = {}
+temp_files = []
+run_metrics = metrics.Metrics(args.metrics, args.profile, os.path.getsize(args.input))
+
+
+# Function to read a fasta file into a list of headers and sequences
+# ============================================================
+
+def readfasta(file_name):
+    fasta_list = []
+    for line in open(file_name, 'r'):
+        line = line.strip()
+        if line.startswith('>'):
+            fasta_list.append([(line[1:].split() or [''])[0], []])
+        elif fasta_list:
+            fasta_list[-1][1].append(line)
+    return [(x[0], ''.join(x[1])) for x in fasta_list]
+
+
+# Function to write a list of headers and sequences to a temporary fasta file
+# ============================================================
+
+def writetemp(fasta_list):
+    out_temp = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(args.output)), suffix='.fa', delete=False)
+    for fasta_header, seq in fasta_list:
+        out_temp.write('>'+fasta_header+'\n'+seq+'\n')
+    out_temp.close()
+    temp_files.append(out_temp.name)
+    return out_temp.name
+
+
+# Function to return the cost of aligning sequences, in units of (number of sequences)^2 * mean length per thread
+# ============================================================
+
+def alignmentcost(num_seqs, mean_length, threads):
+    return float(num_seqs) * float(num_seqs) * float(mean_length) / max(1, int(threads))
+
+
+# Function to choose the most accurate strategy that suits the number and lengths of the sequences and whose
+# estimated runtime fits the budget; seconds per unit of cost are the median of past runs in the strategy log
+# ============================================================
+
+def choosestrategy(num_seqs, mean_length, max_length):
+    rate_dict = {}
+    if os.path.exists(args.log):
+        for line in open(args.log, 'r'):
+            line = line.rstrip('\n').split('\t')
+            if len(line) >= 8 and alignmentcost(line[3], line[4], line[6]) > 0:
+                rate_dict.setdefault(line[2], []).append(float(line[7]) / alignmentcost(line[3], line[4], line[6]))
+    for name, options, max_seqs, max_len, rate in strategy_list:
+        if (max_seqs is not None and num_seqs > max_seqs) or (max_len is not None and max_length > max_len):
+            continue
+        if name in rate_dict:
+            rate = sorted(rate_dict[name])[len(rate_dict[name]) // 2]
+        estimate = alignmentcost(num_seqs, mean_length, args.threads) * rate
+        if args.budget is None or estimate <= args.budget * 60 or name == strategy_list[-1][0]:
+            return name, options, estimate
+
+
+# Function to run MAFFT into a temporary file, replace the output with it, and log the strategy and runtime
+# ============================================================
+
+def runmafft(strategy, options, input_args, fasta_list):
+    start_time = time.time()
+    out_temp = open(args.output+'.tmp', 'w')
+    return_code = subprocess.call([args.mafft] + options.split() + ['--thread', args.threads] + input_args, stdout=out_temp)
+    out_temp.close()
+    for temp_file in temp_files:
+        os.remove(temp_file)
+    if return_code != 0:
+        os.remove(args.output+'.tmp')
+        error('mafft exited with status '+str(return_code), 1)
+    os.rename(args.output+'.tmp', args.output)
+    lengths = [len(x[1].replace('-', '')) for x in fasta_list] or [0]
+    out_strategy = open(args.log, 'a')
+    out_strategy.write('\t'.join([time.strftime('%Y-%m-%d %H:%M:%S'), os.path.abspath(args.input), strategy, str(len(fasta_list)),
+                                  '%.1f' % (float(sum(lengths)) / len(lengths)), str(max(lengths)), args.threads,
+                                  '%.1f' % (time.time() - start_time), options])+'\n')
+    out_strategy.close()
+    if not args.silent:
+        sys.stderr.write("Finished "+strategy+" in "+('%.1f' % (time.time() - start_time))+" seconds.\n")
+
+
+###############################################################################
+# Run
+###############################################################################
+
+# Read input sequences and the digests of the sequences in the existing alignment
+# ============================================================
+
+run_metrics.phase('read')
+input_list = readfasta(args.input)
+run_metrics.count(len(input_list))
+input_digest_dict = dict((x[0], hashlib.sha1(x[1].upper()).hexdigest()) for x in input_list)
+aligned_list = []
+if os.path.exists(args.output):
+    aligned_list = readfasta(args.output)
+    if os.path.exists(digest_file):
+        for line in open(digest_file, 'r'):
+            line = line.rstrip('\n').split('\t')
+            aligned_digest_dict[line[0]] = line[1]
+    else:
+        for fasta_header, seq in aligned_list:
+            aligned_digest_dict[fasta_header] = hashlib.sha1(seq.replace('-', '').upper()).hexdigest()
+
+
+# Find new, changed, and removed sequences; rows removed from the alignment during curation stay removed
+# ============================================================
+
+added_list = [x for x in input_list if x[0] not in aligned_digest_dict or aligned_digest_dict[x[0]] != input_digest_dict[x[0]]]
+drop_set = set([x[0] for x in added_list]) | set([x for x in aligned_digest_dict if x not in input_digest_dict])
+kept_list = [x for x in aligned_list if x[0] not in drop_set]
+changed_count = len(added_list) + len([x for x in aligned_digest_dict if x not in input_digest_dict])
+
+
+# Realign from scratch, add new and changed sequences to the curated alignment, or only drop removed sequences
+# ============================================================
+
+run_metrics.phase('align')
+if not kept_list or changed_count > args.realign * max(1, len(input_list)):
+    if not args.silent:
+        sys.stderr.write("Realigning all "+str(len(input_list))+" sequences as "+str(changed_count)+" are new, changed, or removed.\n")
+    strategy, options = 'custom', args.full
+    if args.full == 'auto':
+        lengths = [len(x[1]) for x in input_list] or [0]
+        strategy, options, estimate = choosestrategy(len(input_list), float(sum(lengths)) / len(lengths), max(lengths))
+        if not args.silent:
+            sys.stderr.write("Choosing "+strategy+" ("+options+") with an estimated runtime of "+('%.0f' % estimate)+" seconds.\n")
+    runmafft(strategy, options, [args.input], input_list)
+elif added_list:
+    if not args.silent:
+        sys.stderr.write("Adding "+str(len(added_list))+" new or changed sequences to the alignment of "+str(len(kept_list))+" sequences.\n")
+    runmafft('add', '--keeplength', ['--add', writetemp(added_list), writetemp(kept_list)], kept_list + added_list)
+elif len(kept_list) != len(aligned_list):
+    if not args.silent:
+        sys.stderr.write("Removing "+str(len(aligned_list) - len(kept_list))+" sequences from the alignment.\n")
+    out_temp = open(args.output+'.tmp', 'w')
+    for fasta_header, seq in kept_list:
+        out_temp.write('>'+fasta_header+'\n'+seq+'\n')
+    out_temp.close()
+    os.rename(args.output+'.tmp', args.output)
+elif not args.silent:
+    sys.stderr.write("Keeping the alignment as no sequences are new, changed, or removed.\n")
+
+
+# Write out the digests of the aligned input sequences
+# ============================================================
+
+run_metrics.phase('write')
+out_digest = open(digest_file, 'w')
+for fasta_header, seq in input_list:
+    out_digest.write(fasta_header+'\t'+input_digest_dict[fasta_header]+'\n')
+out_digest.close()
+run_metrics.close()